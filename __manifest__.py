@@ -18,18 +18,23 @@ Long description of module's purpose
     'version': '0.1',
 
     # any module necessary for this one to work correctly
-    'depends': ['base','mail', 'hr', 'hr_attendance', 'hr_holidays', 'account','web','website',],
+    'depends': ['base','mail', 'bus', 'hr', 'hr_attendance', 'hr_holidays', 'account','web','website',],
 
     # always loaded
     'data': [
         'security/security.xml',
         'security/ir.model.access.csv',
         'data/sequence_data.xml',
+        'data/mail_template_data.xml',
+        'data/ir_cron_data.xml',
         'views/views.xml',
         'views/templates.xml',
         'views/doctor.xml',
+        'views/schedule.xml',
         'views/patient.xml',
+        'views/patient_duplicate.xml',
         'views/appointment.xml',
+        'views/appointment_series.xml',
         'views/prescription.xml',
         'views/cabin.xml',
         'views/word.xml',
@@ -38,6 +43,7 @@ Long description of module's purpose
         'views/attendance.xml',
         'views/leave.xml',
         'views/kpi.xml',
+        'views/benchmark.xml',
         'views/patient_report.xml',
         'views/appointment_report.xml',
         'views/dashboard.xml',
@@ -46,5 +52,11 @@ Long description of module's purpose
     'demo': [
         'demo/demo.xml',
     ],
+    'assets': {
+        'web.assets_frontend': [
+            'clinic_management_system/static/src/js/kpi_live.js',
+        ],
+    },
+    'post_init_hook': 'post_init_hook',
 }
 
@@ -1,35 +1,79 @@
 # -*- coding: utf-8 -*-
 
-from odoo import http
+from odoo import http, fields, api
 from odoo.http import request
-from datetime import datetime, timedelta
+from odoo.tools import SQL
+from datetime import datetime
+import csv
+import hashlib
+import io
 import json
 
+from ..models.appointment import QUEUE_CHANNEL
+
 
 class ClinicKPIController(http.Controller):
 
     @http.route('/clinic/kpi/dashboard', type='http', auth='user', website=True)
-    def kpi_dashboard(self, **kwargs):
+    def kpi_dashboard(self, date_from=None, date_to=None, **kwargs):
         """Main KPI Dashboard Route"""
-        # Get or create KPI record
-        kpi = request.env['clinic.kpi'].search([], limit=1, order='id desc')
-
-        if not kpi:
-            kpi = request.env['clinic.kpi'].create({
-                'name': 'Clinic KPI Dashboard',
-                'date_from': datetime.today().replace(day=1),
-                'date_to': datetime.today()
+        if date_from and date_to:
+            # Explicit range: compute on an in-memory record, nothing is written
+            kpi = request.env['clinic.kpi'].new({
+                'date_from': fields.Date.to_date(date_from),
+                'date_to': fields.Date.to_date(date_to),
             })
+        else:
+            # Get or create KPI record
+            kpi = request.env['clinic.kpi'].search([], limit=1, order='id desc')
+
+            if not kpi:
+                kpi = request.env['clinic.kpi'].create({
+                    'name': 'Clinic KPI Dashboard',
+                    'date_from': datetime.today().replace(day=1),
+                    'date_to': datetime.today()
+                })
 
         # Prepare data for template
         values = {
             'kpi': kpi,
             'date_from': kpi.date_from.strftime('%Y-%m-%d') if kpi.date_from else '',
             'date_to': kpi.date_to.strftime('%Y-%m-%d') if kpi.date_to else '',
+            'comparison': kpi.comparison_period,
         }
 
         return request.render('clinic_management_system.clinic_kpi_dashboard_template', values)
 
+    @http.route('/clinic/kpi/data', type='json', auth='user')
+    def kpi_data(self, date_from, date_to, comparison='previous', **kwargs):
+        """Read-only KPI payload for any date range, safe to call concurrently"""
+        try:
+            date_from = fields.Date.to_date(date_from)
+            date_to = fields.Date.to_date(date_to)
+        except ValueError:
+            date_from = date_to = None
+        if not date_from or not date_to or date_from > date_to:
+            return {
+                'success': False,
+                'message': 'Invalid date range'
+            }
+
+        kpi = request.env['clinic.kpi']
+        if comparison not in dict(kpi._fields['comparison_period'].selection):
+            return {
+                'success': False,
+                'message': 'Invalid comparison period'
+            }
+
+        return {
+            'success': True,
+            'date_from': fields.Date.to_string(date_from),
+            'date_to': fields.Date.to_string(date_to),
+            'comparison': comparison,
+            'data': kpi.with_context(kpi_comparison=comparison)._get_dashboard_data(date_from, date_to),
+            'growth': kpi._get_kpi_growth(date_from, date_to),
+        }
+
     @http.route('/clinic/kpi/update_dates', type='json', auth='user')
     def update_dashboard_dates(self, date_from, date_to, **kwargs):
         """Update dashboard date range via AJAX"""
@@ -58,40 +102,12 @@ class ClinicKPIController(http.Controller):
         kpi = request.env['clinic.kpi'].search([], limit=1, order='id desc')
 
         if kpi:
-            kpi.action_refresh_dashboard()
-
             # Return updated data
             return {
                 'success': True,
-                'data': {
-                    'total_patients': kpi.total_patients,
-                    'new_patients': kpi.new_patients,
-                    'patient_growth': round(kpi.patient_growth, 2),
-                    'total_appointments': kpi.total_appointments,
-                    'completed_appointments': kpi.completed_appointments,
-                    'cancelled_appointments': kpi.cancelled_appointments,
-                    'appointment_completion_rate': round(kpi.appointment_completion_rate, 2),
-                    'total_revenue': round(kpi.total_revenue, 2),
-                    'consultation_revenue': round(kpi.consultation_revenue, 2),
-                    'lab_test_revenue': round(kpi.lab_test_revenue, 2),
-                    'revenue_growth': round(kpi.revenue_growth, 2),
-                    'most_booked_doctor': kpi.most_booked_doctor_id.name if kpi.most_booked_doctor_id else 'N/A',
-                    'total_active_doctors': kpi.total_active_doctors,
-                    'avg_consultation_per_doctor': round(kpi.avg_consultation_per_doctor, 2),
-                    'cabin_occupancy_rate': round(kpi.cabin_occupancy_rate, 2),
-                    'ward_occupancy_rate': round(kpi.ward_occupancy_rate, 2),
-                    'total_admitted_patients': kpi.total_admitted_patients,
-                    'total_staff': kpi.total_staff,
-                    'avg_attendance_rate': round(kpi.avg_attendance_rate, 2),
-                    'total_overtime_hours': round(kpi.total_overtime_hours, 2),
-                    'total_lab_tests': kpi.total_lab_tests,
-                    'completed_lab_tests': kpi.completed_lab_tests,
-                    'pending_lab_tests': kpi.pending_lab_tests,
-                    'lab_completion_rate': round(kpi.lab_completion_rate, 2),
-                    'total_payroll': round(kpi.total_payroll, 2),
-                    'avg_revenue_per_patient': round(kpi.avg_revenue_per_patient, 2),
-                    'profit_margin': round(kpi.profit_margin, 2),
-                }
+                'comparison': kpi.comparison_period,
+                'data': kpi.with_context(kpi_comparison=kpi.comparison_period)._get_dashboard_data(
+                    kpi.date_from, kpi.date_to),
             }
 
         return {
@@ -99,6 +115,39 @@ class ClinicKPIController(http.Controller):
             'message': 'No dashboard found'
         }
 
+    @http.route('/clinic/kpi/profile', type='json', auth='user')
+    def profile_dashboard(self, date_from=None, date_to=None, **kwargs):
+        """Per-section timings and query counts of a dashboard refresh"""
+        if date_from and date_to:
+            try:
+                date_from = fields.Date.to_date(date_from)
+                date_to = fields.Date.to_date(date_to)
+            except ValueError:
+                date_from = date_to = None
+        else:
+            kpi = request.env['clinic.kpi'].search([], limit=1, order='id desc')
+            if not kpi:
+                return {
+                    'success': False,
+                    'message': 'No dashboard found'
+                }
+            date_from, date_to = kpi.date_from, kpi.date_to
+        if not date_from or not date_to or date_from > date_to:
+            return {
+                'success': False,
+                'message': 'Invalid date range'
+            }
+
+        sections = request.env['clinic.kpi.profile']._profile_sections(date_from, date_to)
+        return {
+            'success': True,
+            'date_from': fields.Date.to_string(date_from),
+            'date_to': fields.Date.to_string(date_to),
+            'sections': sections,
+            'total_wall_time': round(sum(section['wall_time'] for section in sections), 3),
+            'total_query_count': sum(section['query_count'] for section in sections),
+        }
+
     @http.route('/clinic/kpi/export', type='http', auth='user')
     def export_kpi_data(self, **kwargs):
         """Export KPI data as JSON"""
@@ -162,4 +211,183 @@ class ClinicKPIController(http.Controller):
                 ]
             )
 
-        return request.not_found()
\ No newline at end of file
+        return request.not_found()
+
+    @http.route('/clinic/kpi/export/series', type='http', auth='user')
+    def export_kpi_series(self, date_from=None, date_to=None, format='csv', granularity='day', **kwargs):
+        """Stream per-day (or per-day and per-doctor) KPI series as CSV or NDJSON"""
+        try:
+            date_from = fields.Date.to_date(date_from)
+            date_to = fields.Date.to_date(date_to)
+        except ValueError:
+            date_from = date_to = None
+        if not date_from or not date_to or date_from > date_to \
+                or format not in ('csv', 'ndjson') or granularity not in ('day', 'doctor'):
+            return request.not_found()
+
+        request.env['clinic.kpi.daily'].check_access_rights('read')
+        columns = request.env['clinic.kpi.daily']._get_series_columns(granularity)
+
+        # The request cursor is closed once the response starts streaming
+        registry, uid, context = request.env.registry, request.env.uid, dict(request.env.context)
+
+        def generate():
+            if format == 'csv':
+                yield ','.join(columns) + '\n'
+            with registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                for rows in env['clinic.kpi.daily']._iter_series(date_from, date_to, granularity):
+                    buffer = io.StringIO()
+                    if format == 'csv':
+                        writer = csv.writer(buffer, lineterminator='\n')
+                        writer.writerows([row[column] for column in columns] for row in rows)
+                    else:
+                        for row in rows:
+                            buffer.write(json.dumps(row, default=str) + '\n')
+                    yield buffer.getvalue()
+
+        content_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+        filename = 'clinic_kpi_%s_%s_%s.%s' % (granularity, date_from, date_to, format)
+        return request.make_response(generate(), headers=[
+            ('Content-Type', content_type),
+            ('Content-Disposition', 'attachment; filename="%s"' % filename),
+        ])
+
+
+class ClinicScheduleController(http.Controller):
+
+    @http.route('/clinic/doctor/free_slots', type='json', auth='user')
+    def doctor_free_slots(self, date_from, date_to, specialization=None, duration=None, **kwargs):
+        """Open appointment slots of the doctors of a specialization"""
+        try:
+            date_from = fields.Date.to_date(date_from)
+            date_to = fields.Date.to_date(date_to)
+        except ValueError:
+            date_from = date_to = None
+        if not date_from or not date_to or date_from > date_to or (date_to - date_from).days > 31:
+            return {
+                'success': False,
+                'message': 'Invalid date range'
+            }
+        if duration is not None and (not isinstance(duration, int) or duration <= 0):
+            return {
+                'success': False,
+                'message': 'Invalid duration'
+            }
+
+        return {
+            'success': True,
+            'date_from': fields.Date.to_string(date_from),
+            'date_to': fields.Date.to_string(date_to),
+            'data': request.env['clinic.doctor']._get_free_slots(
+                date_from, date_to, duration=duration, specialization=specialization),
+        }
+
+    @http.route('/clinic/appointment/calendar_feed', type='http', auth='user', methods=['GET'])
+    def appointment_calendar_feed(self, date_from=None, date_to=None, doctor_ids=None, **kwargs):
+        """Compact appointment feed of a date window for calendars, with ETag revalidation"""
+        try:
+            date_from = fields.Date.to_date(date_from)
+            date_to = fields.Date.to_date(date_to)
+            doctor_ids = [int(doctor_id) for doctor_id in doctor_ids.split(',')] if doctor_ids else []
+        except ValueError:
+            date_from = date_to = None
+        if not date_from or not date_to or date_from > date_to or (date_to - date_from).days > 62:
+            return request.make_json_response({
+                'success': False,
+                'message': 'Invalid date range'
+            }, status=400)
+
+        # The window is read through the appointment_date index, or through the
+        # (doctor_id, appointment_date) one when the feed is restricted to some doctors
+        Appointment = request.env['clinic.appointment']
+        domain = [('appointment_date', '>=', date_from), ('appointment_date', '<=', date_to)]
+        if doctor_ids:
+            domain.append(('doctor_id', 'in', doctor_ids))
+
+        # The window changes whenever an appointment in it is created, removed or
+        # written, or the patient or doctor names it shows are
+        Appointment.flush_model()
+        request.env['clinic.patient'].flush_model()
+        request.env['clinic.doctor'].flush_model()
+        request.env.cr.execute(SQL("""
+            SELECT max(appointment.write_date), max(patient.write_date), max(doctor.write_date),
+                   md5(string_agg(appointment.id::text, ',' ORDER BY appointment.id))
+            FROM clinic_appointment appointment
+            JOIN clinic_patient patient ON patient.id = appointment.patient_id
+            JOIN clinic_doctor doctor ON doctor.id = appointment.doctor_id
+            WHERE appointment.id IN %s
+        """, Appointment._search(domain).subselect()))
+        etag = hashlib.sha1(repr((
+            request.env.uid, date_from, date_to, sorted(doctor_ids), request.env.cr.fetchone(),
+        )).encode()).hexdigest()
+        if request.httprequest.if_none_match.contains(etag):
+            response = request.make_response('', status=304)
+            response.set_etag(etag)
+            return response
+
+        events = []
+        for appointment in Appointment.search_fetch(domain, [
+            'doctor_id', 'patient_id', 'appointment_date', 'appointment_time', 'appointment_end_time', 'state',
+        ], order='appointment_date, appointment_time'):
+            day = fields.Date.to_string(appointment.appointment_date)
+            events.append({
+                'id': appointment.id,
+                'doctor_id': appointment.doctor_id.id,
+                'doctor': appointment.doctor_id.name,
+                'patient': appointment.patient_id.name,
+                'start': '%s %02d:%02d' % ((day,) + divmod(round(appointment.appointment_time * 60), 60)),
+                'end': '%s %02d:%02d' % ((day,) + divmod(round(appointment.appointment_end_time * 60), 60)),
+                'state': appointment.state,
+            })
+
+        response = request.make_json_response({
+            'success': True,
+            'date_from': fields.Date.to_string(date_from),
+            'date_to': fields.Date.to_string(date_to),
+            'events': events,
+        }, headers=[('Cache-Control', 'private, no-cache')])
+        response.set_etag(etag)
+        return response
+
+
+class ClinicQueueController(http.Controller):
+
+    @http.route('/clinic/queue', type='json', auth='user')
+    def triage_queue(self, doctor_id=None, specialization=None, **kwargs):
+        """Current triage queue of a doctor or a department.
+
+        Waiting-room displays load it once, then apply the deltas sent on the
+        ``clinic_queue`` bus channel.
+        """
+        if doctor_id is not None and not isinstance(doctor_id, int):
+            return {
+                'success': False,
+                'message': 'Invalid doctor'
+            }
+        Appointment = request.env['clinic.appointment']
+        return {
+            'success': True,
+            'channel': QUEUE_CHANNEL,
+            'date': fields.Date.to_string(fields.Date.context_today(Appointment)),
+            'data': Appointment._get_queue(doctor_id, specialization)._get_queue_entries(),
+        }
+
+    @http.route('/clinic/queue/next', type='json', auth='user')
+    def call_next_patient(self, doctor_id=None, specialization=None, **kwargs):
+        """Start the appointment at the head of a triage queue"""
+        if doctor_id is not None and not isinstance(doctor_id, int):
+            return {
+                'success': False,
+                'message': 'Invalid doctor'
+            }
+        appointment = request.env['clinic.appointment']._call_next_patient(doctor_id, specialization)
+        if not appointment:
+            return {
+                'success': False,
+                'message': 'The queue is empty'
+            }
+        return {
+            'success': True,
+            'data': appointment._get_queue_entries()[0],
+        }
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+
+def post_init_hook(env):
+    # Build the daily KPI facts from the records already in the database
+    env['clinic.kpi.daily']._refresh_days()
+    # Precompute the doctors' availability over the scheduling horizon
+    env['clinic.doctor']._cron_refresh_availability()
+    # Start the nightly age refresh from today
+    env['clinic.patient']._cron_refresh_ages()
@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 
 from . import models
+from . import kpi_daily
+from . import sequence_mixin
+from . import age_mixin
 from . import doctor
+from . import schedule
 from . import  patient
+from . import patient_duplicate
 from . import  appointment
+from . import appointment_series
 from . import  prescription
 from . import cabin
 from . import  lab
@@ -11,4 +17,8 @@ from . import payroll
 from . import  attendance
 
 from . import leave
-from . import kpi
\ No newline at end of file
+from . import hr_employee
+from . import kpi
+from . import kpi_profile
+from . import benchmark
+from . import ir_websocket
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import calendar
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+# Models whose stored ages the nightly job keeps current
+AGE_MODELS = ['clinic.patient', 'clinic.doctor']
+
+_LAST_RUN_PARAM = 'clinic_management_system.age_refresh_date'
+# After a year without a run every birthday has passed, so all ages are checked
+_MAX_REFRESH_DAYS = 366
+
+
+class ClinicAgeMixin(models.AbstractModel):
+    _name = 'clinic.age.mixin'
+    _description = 'Clinic Record With an Age'
+
+    date_of_birth = fields.Date(string='Date of Birth')
+    age = fields.Integer(string='Age', compute='_compute_age', store=True)
+    birthday_key = fields.Integer(string='Birthday Key', compute='_compute_birthday_key', store=True,
+                                  index=True, help='Month and day of birth as MMDD.')
+
+    @api.depends('date_of_birth')
+    def _compute_age(self):
+        for record in self:
+            if record.date_of_birth:
+                today = fields.Date.today()
+                record.age = today.year - record.date_of_birth.year - (
+                        (today.month, today.day) < (record.date_of_birth.month, record.date_of_birth.day)
+                )
+            else:
+                record.age = 0
+
+    @api.depends('date_of_birth')
+    def _compute_birthday_key(self):
+        for record in self:
+            birthday = record.date_of_birth
+            record.birthday_key = birthday.month * 100 + birthday.day if birthday else 0
+
+    @api.model
+    def _get_birthday_keys(self, date_from, date_to):
+        """Return the birthday keys of the days after ``date_from`` up to ``date_to``.
+
+        People born on February 29 turn a year older on March 1 of common years.
+        """
+        keys = set()
+        day = date_from + timedelta(days=1)
+        while day <= date_to:
+            keys.add(day.month * 100 + day.day)
+            if (day.month, day.day) == (3, 1) and not calendar.isleap(day.year):
+                keys.add(229)
+            day += timedelta(days=1)
+        return keys
+
+    @api.model
+    def _refresh_ages(self, keys, today):
+        """Recompute the ages of the records born on ``keys``, or of all records
+        when ``keys`` is None, in a single statement. Return the changed ids.
+        """
+        if keys is not None and not keys:
+            return []
+        self.flush_model(['date_of_birth', 'age', 'birthday_key'])
+        query = """
+            UPDATE "%s" SET age = date_part('year', age(%%(today)s, date_of_birth))::int
+            WHERE date_of_birth IS NOT NULL
+              AND age IS DISTINCT FROM date_part('year', age(%%(today)s, date_of_birth))::int
+        """ % self._table
+        if keys is not None:
+            query += " AND birthday_key IN %(keys)s"
+        self.env.cr.execute(query + " RETURNING id", {'today': today, 'keys': tuple(keys or ())})
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_model(['age'])
+        return ids
+
+    @api.model
+    def _cron_refresh_ages(self):
+        """Refresh the stored ages of the people whose birthday fell since the last run"""
+        params = self.env['ir.config_parameter'].sudo()
+        today = fields.Date.today()
+        last_run = fields.Date.to_date(params.get_param(_LAST_RUN_PARAM))
+        if last_run and last_run >= today:
+            return
+        keys = None
+        if last_run and (today - last_run).days <= _MAX_REFRESH_DAYS:
+            keys = self._get_birthday_keys(last_run, today)
+        for model in AGE_MODELS:
+            self.env[model]._refresh_ages(keys, today)
+        params.set_param(_LAST_RUN_PARAM, fields.Date.to_string(today))
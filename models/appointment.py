@@ -1,22 +1,48 @@
 # -*- coding: utf-8 -*-
 
+import logging
+from contextlib import contextmanager
+
+import psycopg2
+
 from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
+from odoo.tools.sql import create_index
 from datetime import timedelta
 
+_logger = logging.getLogger(__name__)
+
+# Fields of the non-overlapping booking exclusion constraint
+_BOOKING_FIELDS = ['doctor_id', 'appointment_date', 'appointment_time', 'appointment_end_time', 'state']
+
+# Bus channel of the waiting-room displays, and the fields moving a checked-in
+# appointment into, within or out of a triage queue
+QUEUE_CHANNEL = 'clinic_queue'
+_QUEUE_FIELDS = ['state', 'arrival_time', 'priority', 'appointment_type', 'doctor_id', 'appointment_date']
+_QUEUE_ORDER = 'priority desc, arrival_time, id'
+_QUEUE_ENTRY_FIELDS = ['appointment_number', 'doctor_id', 'doctor_specialization', 'appointment_type',
+                       'priority', 'arrival_time']
+_QUEUE_CHANGES_KEY = 'clinic.appointment.queue.changed'
+
 
 class ClinicAppointment(models.Model):
     _name = 'clinic.appointment'
     _description = 'Appointment'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.kpi.source.mixin', 'clinic.sequence.mixin']
     _rec_name = 'appointment_number'
     _order = 'appointment_date desc, appointment_time desc'
+    _kpi_date_field = 'appointment_date'
+    _kpi_fields = ('appointment_date', 'doctor_id', 'state', 'additional_charges')
+    _kpi_sections = ('appointment', 'revenue', 'doctor', 'financial')
+    _sequence_field = 'appointment_number'
+    _sequence_code = 'clinic.appointment'
 
     appointment_number = fields.Char(string='Appointment Number', required=True,
                                      copy=False, readonly=True, default=lambda self: _('New'))
 
     # Patient and Doctor
-    patient_id = fields.Many2one('clinic.patient', string='Patient', required=True, tracking=True)
+    patient_id = fields.Many2one('clinic.patient', string='Patient', required=True, index=True, tracking=True)
     patient_age = fields.Integer(related='patient_id.age', string='Patient Age', store=True)
     patient_phone = fields.Char(related='patient_id.phone', string='Patient Phone')
 
@@ -25,10 +51,11 @@ class ClinicAppointment(models.Model):
                                              string='Specialization', store=True)
 
     # Appointment Details
-    appointment_date = fields.Date(string='Appointment Date', required=True,
+    appointment_date = fields.Date(string='Appointment Date', required=True, index=True,
                                    default=fields.Date.today, tracking=True)
     appointment_time = fields.Float(string='Appointment Time', required=True)
-    appointment_end_time = fields.Float(string='End Time', compute='_compute_end_time', store=True)
+    appointment_end_time = fields.Float(string='End Time', compute='_compute_end_time', store=True,
+                                        precompute=True)
     duration = fields.Integer(string='Duration (minutes)', default=30)
 
     # Appointment Type
@@ -39,6 +66,15 @@ class ClinicAppointment(models.Model):
         ('checkup', 'Regular Checkup'),
     ], string='Appointment Type', required=True, default='consultation')
 
+    # Triage
+    priority = fields.Selection([
+        ('0', 'Normal'),
+        ('1', 'Urgent'),
+        ('2', 'Emergency'),
+    ], string='Priority', compute='_compute_priority', store=True, readonly=False,
+        precompute=True, tracking=True)
+    arrival_time = fields.Datetime(string='Arrival Time', copy=False, readonly=True)
+
     # Clinical Information
     symptoms = fields.Text(string='Symptoms')
     diagnosis = fields.Text(string='Diagnosis')
@@ -75,14 +111,82 @@ class ClinicAppointment(models.Model):
     prescription_id = fields.Many2one('clinic.prescription', string='Prescription')
     lab_test_ids = fields.One2many('clinic.lab.test', 'appointment_id', string='Lab Tests')
 
+    series_id = fields.Many2one('clinic.appointment.series', string='Series', readonly=True,
+                                index='btree_not_null', ondelete='set null', copy=False)
+
     # Reminder
     reminder_sent = fields.Boolean(string='Reminder Sent', default=False)
 
-    @api.model
-    def create(self, vals):
-        if vals.get('appointment_number', _('New')) == _('New'):
-            vals['appointment_number'] = self.env['ir.sequence'].next_by_code('clinic.appointment') or _('New')
-        return super(ClinicAppointment, self).create(vals)
+    _sql_constraints = [
+        ('doctor_booking_no_overlap',
+         "EXCLUDE USING gist (doctor_id WITH =, appointment_date WITH =, "
+         "numrange(appointment_time::numeric, appointment_end_time::numeric) WITH &&) "
+         "WHERE (state != 'cancelled')",
+         'This time slot is already booked for this doctor.'),
+    ]
+
+    def init(self):
+        # Serves the free-slot search and the batched overlap check, which both load
+        # the bookings of some doctors over some days
+        create_index(self.env.cr, 'clinic_appointment_doctor_date_idx', self._table,
+                     ['doctor_id', 'appointment_date'])
+        # Serves the reminder job: only confirmed appointments still waiting for a reminder
+        create_index(self.env.cr, 'clinic_appointment_reminder_due_idx', self._table,
+                     ['appointment_date', 'id'], where="state = 'confirmed' AND reminder_sent IS NOT TRUE")
+        # Serve the triage queues of a doctor and of a department already in queue order,
+        # so the next patient is the first entry of the index
+        for name, column in [('doctor', 'doctor_id'), ('department', 'doctor_specialization')]:
+            create_index(self.env.cr, 'clinic_appointment_queue_%s_idx' % name, self._table,
+                         [column, 'appointment_date', 'priority DESC', 'arrival_time', 'id'],
+                         where="state = 'confirmed' AND arrival_time IS NOT NULL")
+
+    def _auto_init(self):
+        # The exclusion constraint needs GiST operator classes for integers and dates
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        except psycopg2.Error:
+            _logger.warning("Could not create the btree_gist extension, appointment "
+                            "overlaps are only checked by _check_doctor_availability")
+        return super(ClinicAppointment, self)._auto_init()
+
+    @contextmanager
+    def _map_booking_overlap(self):
+        """Turn a violation of the booking exclusion constraint into a ValidationError"""
+        try:
+            # Flushing only the bookings checks the constraint here, without running
+            # the precommit hooks a full flush of the transaction would
+            with self.env.cr.savepoint(flush=False):
+                yield
+                self.flush_model(_BOOKING_FIELDS)
+        except psycopg2.errors.ExclusionViolation as e:
+            if e.diag.constraint_name != '%s_doctor_booking_no_overlap' % self._table:
+                raise
+            raise ValidationError(_('This time slot is already booked for this doctor.')) from None
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        with self._map_booking_overlap():
+            appointments = super(ClinicAppointment, self).create(vals_list)
+        appointments.filtered('arrival_time')._queue_changed()
+        return appointments
+
+    def write(self, vals):
+        queued = self.filtered('arrival_time') if any(fname in vals for fname in _QUEUE_FIELDS) else self.browse()
+        if not any(fname in vals for fname in _BOOKING_FIELDS + ['duration']):
+            res = super(ClinicAppointment, self).write(vals)
+        else:
+            # The bookings are flushed in the savepoint, so the constraint is checked here
+            with self._map_booking_overlap():
+                res = super(ClinicAppointment, self).write(vals)
+        if 'arrival_time' in vals:
+            queued |= self.filtered('arrival_time')
+        queued._queue_changed()
+        return res
+
+    def unlink(self):
+        self.filtered('arrival_time')._queue_changed()
+        return super(ClinicAppointment, self).unlink()
 
     @api.depends('appointment_time', 'duration')
     def _compute_end_time(self):
@@ -92,6 +196,14 @@ class ClinicAppointment(models.Model):
             else:
                 record.appointment_end_time = record.appointment_time
 
+    @api.depends('appointment_type')
+    def _compute_priority(self):
+        for record in self:
+            if record.appointment_type == 'emergency':
+                record.priority = '2'
+            elif not record.priority or record.priority == '2':
+                record.priority = '0'
+
     @api.depends('consultation_fee', 'additional_charges')
     def _compute_total_amount(self):
         for record in self:
@@ -112,45 +224,70 @@ class ClinicAppointment(models.Model):
             else:
                 record.payment_status = 'paid'
 
+    @api.constrains('duration')
+    def _check_duration(self):
+        for record in self:
+            if record.duration < 0:
+                raise ValidationError(_('Appointment duration cannot be negative.'))
+
     @api.constrains('appointment_date', 'appointment_time', 'doctor_id')
     def _check_doctor_availability(self):
-        for record in self:
-            if record.appointment_date and record.doctor_id:
-                # Check if doctor is available on that day
-                weekday = record.appointment_date.weekday()
-                available_days = {
-                    0: record.doctor_id.monday_available,
-                    1: record.doctor_id.tuesday_available,
-                    2: record.doctor_id.wednesday_available,
-                    3: record.doctor_id.thursday_available,
-                    4: record.doctor_id.friday_available,
-                    5: record.doctor_id.saturday_available,
-                    6: record.doctor_id.sunday_available,
-                }
-
-                if not available_days.get(weekday, False):
-                    raise ValidationError(_('Doctor is not available on this day.'))
-
-                # Check working hours
-                if record.appointment_time < record.doctor_id.working_hours_start or \
-                        record.appointment_time > record.doctor_id.working_hours_end:
-                    raise ValidationError(_('Appointment time is outside doctor working hours.'))
-
-                # Check for overlapping appointments
-                overlapping = self.search([
-                    ('id', '!=', record.id),
-                    ('doctor_id', '=', record.doctor_id.id),
-                    ('appointment_date', '=', record.appointment_date),
-                    ('state', 'not in', ['cancelled']),
-                    '|',
-                    '&', ('appointment_time', '<=', record.appointment_time),
-                    ('appointment_end_time', '>', record.appointment_time),
-                    '&', ('appointment_time', '<', record.appointment_end_time),
-                    ('appointment_end_time', '>=', record.appointment_end_time),
-                ])
-
-                if overlapping:
-                    raise ValidationError(_('This time slot is already booked for this doctor.'))
+        records = self.filtered(lambda r: r.appointment_date and r.doctor_id)
+        if not records:
+            return
+        dates = records.mapped('appointment_date')
+        availability = records.doctor_id._get_availability(min(dates), max(dates))
+        for record in records:
+            # Check if doctor is available on that day
+            intervals = availability.get((record.doctor_id.id, record.appointment_date))
+            if not intervals:
+                raise ValidationError(_('Doctor is not available on this day.'))
+
+            # Check working hours
+            if not any(hour_from <= record.appointment_time <= hour_to for hour_from, hour_to in intervals):
+                raise ValidationError(_('Appointment time is outside doctor working hours.'))
+
+        # Check for overlapping appointments, within the batch and against the
+        # existing bookings of the same doctors and days, loaded in one query
+        # served by the (doctor_id, appointment_date) index
+        records = records.filtered(lambda r: r.state != 'cancelled')
+        if not records:
+            return
+        intervals = {}
+        for record in records:
+            intervals.setdefault((record.doctor_id.id, record.appointment_date), []).append(
+                (record.appointment_time, record.appointment_end_time, True))
+
+        existing = self.search_fetch([
+            ('id', 'not in', records.ids),
+            ('doctor_id', 'in', records.doctor_id.ids),
+            ('appointment_date', 'in', list({record.appointment_date for record in records})),
+            ('state', '!=', 'cancelled'),
+        ], ['doctor_id', 'appointment_date', 'appointment_time', 'appointment_end_time'])
+        for appointment in existing:
+            key = (appointment.doctor_id.id, appointment.appointment_date)
+            if key in intervals:
+                intervals[key].append((appointment.appointment_time, appointment.appointment_end_time, False))
+
+        for day_intervals in intervals.values():
+            if self._find_overlap(day_intervals):
+                raise ValidationError(_('This time slot is already booked for this doctor.'))
+
+    @api.model
+    def _find_overlap(self, intervals):
+        """Return whether an interval of the batch overlaps another one.
+
+        ``intervals`` are ``(start, end, in_batch)`` tuples; sorting them by
+        start lets a single sweep compare each interval with the one reaching
+        furthest so far. Overlaps between existing bookings are ignored.
+        """
+        reach, reach_in_batch = None, False
+        for start, end, in_batch in sorted(intervals):
+            if reach is not None and start < reach and (in_batch or reach_in_batch):
+                return True
+            if reach is None or end > reach:
+                reach, reach_in_batch = end, in_batch
+        return False
 
     def action_confirm(self):
         for record in self:
@@ -168,6 +305,89 @@ class ClinicAppointment(models.Model):
         for record in self:
             record.state = 'cancelled'
 
+    def action_check_in(self):
+        """Register the arrival of the patients, placing them in their doctor's triage queue"""
+        if any(record.state not in ('draft', 'confirmed') for record in self):
+            raise UserError(_('Only draft or confirmed appointments can be checked in.'))
+        self.filtered(lambda r: not r.arrival_time).write({
+            'state': 'confirmed',
+            'arrival_time': fields.Datetime.now(),
+        })
+
+    @api.model
+    def _get_queue_domain(self, doctor_id=None, specialization=None):
+        """Domain of today's checked-in appointments still waiting, for a doctor or a department"""
+        domain = [
+            ('appointment_date', '=', fields.Date.context_today(self)),
+            ('state', '=', 'confirmed'),
+            ('arrival_time', '!=', False),
+        ]
+        if doctor_id:
+            domain.append(('doctor_id', '=', doctor_id))
+        if specialization:
+            domain.append(('doctor_specialization', '=', specialization))
+        return domain
+
+    @api.model
+    def _get_queue(self, doctor_id=None, specialization=None, limit=None):
+        """Waiting appointments by priority, then arrival, read through the queue indexes"""
+        return self.search_fetch(self._get_queue_domain(doctor_id, specialization), _QUEUE_ENTRY_FIELDS,
+                                 order=_QUEUE_ORDER, limit=limit)
+
+    @api.model
+    def _call_next_patient(self, doctor_id=None, specialization=None):
+        """Start the appointment at the head of a triage queue and return it.
+
+        The head is locked before it is started, so receptionists calling the
+        next patient at the same time each get a different one.
+        """
+        query = self._search(self._get_queue_domain(doctor_id, specialization), order=_QUEUE_ORDER, limit=1)
+        self.env.cr.execute(SQL("%s FOR UPDATE SKIP LOCKED", query.select()))
+        appointment = self.browse(row[0] for row in self.env.cr.fetchall())
+        appointment.action_start()
+        return appointment
+
+    def _get_queue_entries(self):
+        """Waiting-room display entries; clients order them by priority, then arrival"""
+        return [{
+            'id': appointment.id,
+            'number': appointment.appointment_number,
+            'doctor_id': appointment.doctor_id.id,
+            'doctor': appointment.doctor_id.name,
+            'specialization': appointment.doctor_specialization,
+            'appointment_type': appointment.appointment_type,
+            'priority': appointment.priority,
+            'arrival_time': fields.Datetime.to_string(appointment.arrival_time),
+        } for appointment in self]
+
+    def _queue_changed(self):
+        if not self:
+            return
+        data = self.env.cr.precommit.data
+        changed = data.get(_QUEUE_CHANGES_KEY)
+        if changed is None:
+            changed = data[_QUEUE_CHANGES_KEY] = set()
+            self.env.cr.precommit.add(self.browse()._push_queue_changes)
+        changed.update(self.ids)
+
+    @api.model
+    def _push_queue_changes(self):
+        """Send the queue entries the transaction added, moved or removed to the waiting-room displays.
+
+        Runs just before commit, once per transaction; displays apply the
+        delta to the queue they loaded instead of fetching it again.
+        """
+        ids = self.env.cr.precommit.data.pop(_QUEUE_CHANGES_KEY, None)
+        if not ids:
+            return
+        queued = self.search_fetch(self._get_queue_domain() + [('id', 'in', list(ids))], _QUEUE_ENTRY_FIELDS)
+        self.env['bus.bus']._sendone(QUEUE_CHANNEL, 'clinic_queue/update', {
+            'date': fields.Date.to_string(fields.Date.context_today(self)),
+            'entries': queued._get_queue_entries(),
+            'removed': sorted(ids - set(queued.ids)),
+        })
+        self.env.flush_all()
+
     def action_create_prescription(self):
         self.ensure_one()
         return {
@@ -187,7 +407,7 @@ class ClinicAppointment(models.Model):
         self.ensure_one()
         invoice_vals = {
             'move_type': 'out_invoice',
-            'partner_id': self.patient_id.id,
+            'partner_id': self.patient_id._get_invoice_partner().id,
             'invoice_date': fields.Date.today(),
             'invoice_line_ids': [(0, 0, {
                 'name': f'Consultation - {self.doctor_id.name}',
@@ -204,4 +424,109 @@ class ClinicAppointment(models.Model):
             'res_id': invoice.id,
             'view_mode': 'form',
             'target': 'current',
-        }
\ No newline at end of file
+        }
+
+    def action_create_invoices(self):
+        """Invoice the selected done appointments and their completed lab tests, one invoice per patient"""
+        appointments = self.filtered(lambda a: a.state == 'done' and not a.invoice_id)
+        if not appointments:
+            raise UserError(_('There is no completed appointment left to invoice in the selection.'))
+
+        lab_tests = self.env['clinic.lab.test'].search([
+            ('appointment_id', 'in', appointments.ids),
+            ('state', '=', 'completed'),
+            ('invoice_id', '=', False),
+        ]).grouped(lambda test: test.appointment_id.patient_id)
+
+        appointments.patient_id._get_invoice_partner()
+        today = fields.Date.today()
+        invoice_vals_list, invoiced = [], []
+        for patient, patient_appointments in appointments.grouped('patient_id').items():
+            tests = lab_tests.get(patient, self.env['clinic.lab.test'])
+            lines = [(0, 0, {
+                'name': f'Consultation - {appointment.doctor_id.name} ({appointment.appointment_number})',
+                'quantity': 1,
+                'price_unit': appointment.total_amount,
+            }) for appointment in patient_appointments] + [(0, 0, {
+                'name': f'Lab Test - {test.test_name} ({test.test_number})',
+                'quantity': 1,
+                'price_unit': test.test_cost,
+            }) for test in tests]
+            invoice_vals_list.append({
+                'move_type': 'out_invoice',
+                'partner_id': patient.partner_id.id,
+                'invoice_date': today,
+                'invoice_line_ids': lines,
+            })
+            invoiced.append((patient_appointments, tests))
+
+        invoices = self.env['account.move'].create(invoice_vals_list)
+        for invoice, (patient_appointments, tests) in zip(invoices, invoiced):
+            patient_appointments.invoice_id = invoice
+            tests.invoice_id = invoice
+        return {
+            'name': _('Invoices'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'account.move',
+            'view_mode': 'tree,form',
+            'domain': [('id', 'in', invoices.ids)],
+            'target': 'current',
+        }
+
+    @api.model
+    def _cron_send_reminders(self, chunk_size=500):
+        """Queue reminder emails for confirmed appointments of the coming days.
+
+        Due appointments of patients with an email are read in
+        ``(appointment_date, id)`` order through the partial reminder index,
+        one chunk at a time, and each chunk is committed on its own.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        days_ahead = int(params.get_param('clinic_management_system.reminder_days_ahead', 1))
+        template = self.env.ref('clinic_management_system.mail_template_appointment_reminder',
+                                raise_if_not_found=False)
+        if not template:
+            return
+        today = fields.Date.context_today(self)
+        self.flush_model(['state', 'reminder_sent', 'appointment_date', 'patient_id'])
+        self.env['clinic.patient'].flush_model(['email'])
+        last_date, last_id = today, 0
+        while True:
+            self.env.cr.execute("""
+                SELECT appointment.appointment_date, appointment.id
+                FROM clinic_appointment appointment
+                JOIN clinic_patient patient ON patient.id = appointment.patient_id
+                WHERE appointment.state = 'confirmed' AND appointment.reminder_sent IS NOT TRUE
+                  AND (appointment.appointment_date, appointment.id) > (%s, %s)
+                  AND appointment.appointment_date <= %s
+                  AND patient.email IS NOT NULL AND patient.email != ''
+                ORDER BY appointment.appointment_date, appointment.id
+                LIMIT %s
+            """, [last_date, last_id, today + timedelta(days=days_ahead), chunk_size])
+            rows = self.env.cr.fetchall()
+            if not rows:
+                break
+            self.browse([row[1] for row in rows])._send_reminders(template)
+            last_date, last_id = rows[-1]
+            if not self.pool.in_test_mode():
+                self.env.cr.commit()
+            self.env.invalidate_all()
+
+    def _send_reminders(self, template):
+        """Render the reminder of every appointment at once and queue it in the mail queue"""
+        appointments = self.filtered(lambda a: a.patient_id.email)
+        if not appointments:
+            return
+        subjects = template._render_field('subject', appointments.ids)
+        bodies = template._render_field('body_html', appointments.ids)
+        email_from = self.env.company.email_formatted or self.env.user.email_formatted
+        self.env['mail.mail'].sudo().create([{
+            'subject': subjects[appointment.id],
+            'body_html': bodies[appointment.id],
+            'email_from': email_from,
+            'email_to': appointment.patient_id.email,
+            'model': self._name,
+            'res_id': appointment.id,
+            'auto_delete': True,
+        } for appointment in appointments])
+        appointments.write({'reminder_sent': True})
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+from dateutil.relativedelta import relativedelta
+
+# Upper bound of the occurrences of one series, two years of weekly visits
+MAX_OCCURRENCES = 104
+
+
+class ClinicAppointmentSeries(models.Model):
+    _name = 'clinic.appointment.series'
+    _description = 'Recurring Appointment Series'
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.sequence.mixin']
+    _rec_name = 'name'
+    _order = 'start_date desc, id desc'
+    _sequence_field = 'name'
+    _sequence_code = 'clinic.appointment.series'
+
+    name = fields.Char(string='Series Number', required=True, copy=False,
+                       readonly=True, default=lambda self: _('New'))
+
+    patient_id = fields.Many2one('clinic.patient', string='Patient', required=True, tracking=True)
+    doctor_id = fields.Many2one('clinic.doctor', string='Doctor', required=True, tracking=True)
+    appointment_type = fields.Selection(
+        selection=lambda self: self.env['clinic.appointment']._fields['appointment_type'].selection,
+        string='Appointment Type', required=True, default='follow_up')
+    appointment_time = fields.Float(string='Appointment Time', required=True)
+    duration = fields.Integer(string='Duration (minutes)', default=30)
+
+    # Recurrence
+    recurrence = fields.Selection([
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ], string='Repeat', required=True, default='weekly', tracking=True)
+    interval = fields.Integer(string='Every', required=True, default=1)
+    start_date = fields.Date(string='Start Date', required=True, default=fields.Date.today)
+    end_type = fields.Selection([
+        ('count', 'Number of Appointments'),
+        ('end_date', 'End Date'),
+    ], string='Until', required=True, default='count')
+    count = fields.Integer(string='Appointments', default=4)
+    end_date = fields.Date(string='End Date')
+
+    # Result
+    appointment_ids = fields.One2many('clinic.appointment', 'series_id', string='Appointments')
+    appointment_count = fields.Integer(string='Scheduled', compute='_compute_appointment_count')
+    conflict_ids = fields.One2many('clinic.appointment.series.conflict', 'series_id', string='Conflicts')
+
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('scheduled', 'Scheduled'),
+    ], string='Status', default='draft', tracking=True)
+
+    notes = fields.Text(string='Notes')
+
+    @api.depends('appointment_ids')
+    def _compute_appointment_count(self):
+        for record in self:
+            record.appointment_count = len(record.appointment_ids)
+
+    @api.constrains('recurrence', 'interval', 'count', 'end_type', 'start_date', 'end_date')
+    def _check_recurrence(self):
+        for record in self:
+            if record.interval < 1:
+                raise ValidationError(_('The repeat interval must be at least 1.'))
+            if record.end_type == 'count' and not 1 <= record.count <= MAX_OCCURRENCES:
+                raise ValidationError(_('A series has between 1 and %s appointments.') % MAX_OCCURRENCES)
+            if record.end_type == 'end_date' and (not record.end_date or record.end_date < record.start_date):
+                raise ValidationError(_('The end date must be after the start date.'))
+            if (record.end_type == 'end_date'
+                    and record.start_date + record._get_recurrence_step() * MAX_OCCURRENCES <= record.end_date):
+                raise ValidationError(_('A series has at most %s appointments, choose an earlier end date.')
+                                      % MAX_OCCURRENCES)
+
+    def _get_recurrence_step(self):
+        self.ensure_one()
+        if self.recurrence == 'weekly':
+            return relativedelta(weeks=self.interval)
+        # Monthly steps are taken from the start date, so the 31st stays the
+        # last day of shorter months instead of drifting
+        return relativedelta(months=self.interval)
+
+    def _get_occurrence_dates(self):
+        self.ensure_one()
+        step = self._get_recurrence_step()
+        limit = self.count if self.end_type == 'count' else MAX_OCCURRENCES
+        dates = []
+        for index in range(limit):
+            date = self.start_date + step * index
+            if self.end_type == 'end_date' and date > self.end_date:
+                break
+            dates.append(date)
+        return dates
+
+    def _check_occurrences(self, dates):
+        """Split occurrence dates into bookable dates and ``{date: reason}`` conflicts.
+
+        The doctor's availability and existing bookings on all dates are each
+        loaded in one query.
+        """
+        self.ensure_one()
+        doctor = self.doctor_id
+        start, end = self.appointment_time, self.appointment_time + self.duration / 60.0
+        Appointment = self.env['clinic.appointment']
+
+        booked = {}
+        for appointment in Appointment.search_fetch([
+            ('doctor_id', '=', doctor.id),
+            ('appointment_date', 'in', dates),
+            ('state', '!=', 'cancelled'),
+        ], ['appointment_date', 'appointment_time', 'appointment_end_time']):
+            booked.setdefault(appointment.appointment_date, []).append(
+                (appointment.appointment_time, appointment.appointment_end_time, False))
+
+        availability = doctor._get_availability(min(dates), max(dates)) if dates else {}
+        valid, conflicts = [], {}
+        for date in dates:
+            intervals = availability.get((doctor.id, date))
+            if not intervals:
+                conflicts[date] = _('Doctor is not available on this day.')
+            elif not any(hour_from <= start <= hour_to for hour_from, hour_to in intervals):
+                conflicts[date] = _('Appointment time is outside doctor working hours.')
+            elif Appointment._find_overlap(booked.get(date, []) + [(start, end, True)]):
+                conflicts[date] = _('This time slot is already booked for this doctor.')
+            else:
+                valid.append(date)
+        return valid, conflicts
+
+    def action_schedule(self):
+        """Create every bookable occurrence at once and record the conflicting dates"""
+        for record in self:
+            if record.state != 'draft':
+                raise UserError(_('Series %s is already scheduled.') % record.name)
+            valid, conflicts = record._check_occurrences(record._get_occurrence_dates())
+            self.env['clinic.appointment'].create([{
+                'series_id': record.id,
+                'patient_id': record.patient_id.id,
+                'doctor_id': record.doctor_id.id,
+                'appointment_type': record.appointment_type,
+                'appointment_date': date,
+                'appointment_time': record.appointment_time,
+                'duration': record.duration,
+            } for date in valid])
+            record.write({
+                'state': 'scheduled',
+                'conflict_ids': [(5, 0, 0)] + [
+                    (0, 0, {'date': date, 'reason': reason}) for date, reason in sorted(conflicts.items())
+                ],
+            })
+
+    def action_view_appointments(self):
+        self.ensure_one()
+        return {
+            'name': _('Appointments'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'clinic.appointment',
+            'view_mode': 'tree,form,calendar',
+            'domain': [('series_id', '=', self.id)],
+            'context': {'default_series_id': self.id},
+        }
+
+
+class ClinicAppointmentSeriesConflict(models.Model):
+    _name = 'clinic.appointment.series.conflict'
+    _description = 'Recurring Appointment Conflict'
+    _rec_name = 'date'
+    _order = 'date'
+
+    series_id = fields.Many2one('clinic.appointment.series', string='Series',
+                                required=True, ondelete='cascade')
+    date = fields.Date(string='Date', required=True)
+    reason = fields.Char(string='Reason')
@@ -8,9 +8,12 @@ from datetime import datetime, timedelta
 class ClinicAttendance(models.Model):
     _name = 'clinic.attendance'
     _description = 'Clinic Attendance'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.kpi.source.mixin']
     _rec_name = 'employee_id'
     _order = 'attendance_date desc, check_in desc'
+    _kpi_date_field = 'attendance_date'
+    _kpi_fields = ('attendance_date', 'check_in', 'check_out', 'expected_hours', 'shift')
+    _kpi_sections = ('attendance',)
 
     employee_id = fields.Many2one('hr.employee', string='Employee', required=True, tracking=True)
     employee_type = fields.Selection([
@@ -28,7 +31,8 @@ class ClinicAttendance(models.Model):
                                     related='employee_id.department_id', store=True)
 
     # Attendance Details
-    attendance_date = fields.Date(string='Date', required=True, default=fields.Date.today, tracking=True)
+    attendance_date = fields.Date(string='Date', required=True, index=True, default=fields.Date.today,
+                                  tracking=True)
 
     check_in = fields.Datetime(string='Check In', required=True, tracking=True)
     check_out = fields.Datetime(string='Check Out', tracking=True)
@@ -0,0 +1,587 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import math
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+
+from .kpi_cache import kpi_cache
+from .kpi_profile import _SectionProfiler
+from .patient import phonetic_key
+
+_logger = logging.getLogger(__name__)
+
+# Prefix of every generated record number, used to find and purge them
+BENCHMARK_PREFIX = 'BENCH-'
+BENCHMARK_STAFF = 'Benchmark Staff'
+
+# Appointment slots per doctor and working day (09:00 to 17:00, 30 minutes each)
+_SLOTS_PER_DAY = 16
+
+# Words of the generated patient names, which spell the patient's index in base 40
+_FIRST_NAMES = [
+    'Olivia', 'Liam', 'Amara', 'Noah', 'Sofia', 'Mateo', 'Yuki', 'Elijah', 'Priya', 'Lucas',
+    'Fatima', 'Hugo', 'Ingrid', 'Kwame', 'Leila', 'Oscar', 'Nadia', 'Rafael', 'Chloe', 'Tariq',
+    'Zara', 'Viktor', 'Mei', 'Diego', 'Hana', 'Jonas', 'Aisha', 'Felix', 'Greta', 'Omar',
+    'Beatriz', 'Sven', 'Daria', 'Pablo', 'Esther', 'Kofi', 'Wanda', 'Ravi', 'Ursula', 'Emil',
+]
+_LAST_NAMES = [
+    'Smith', 'Okafor', 'Tanaka', 'Novak', 'Garcia', 'Lindqvist', 'Patel', 'Moreau', 'Kowalski', 'Haddad',
+    'Fischer', 'Mensah', 'Rossi', 'Yilmaz', 'Jensen', 'Dubois', 'Quispe', 'Bauer', 'Wojcik', 'Castillo',
+    'Varga', 'Nguyen', 'Ahmadi', 'Eriksen', 'Lopez', 'Zhang', 'Petrov', 'Brennan', 'Mwangi', 'Hughes',
+    'Santos', 'Keller', 'Duarte', 'Ivanova', 'Gallagher', 'Murphy', 'Abara', 'Tremblay', 'Olsen', 'Vidal',
+]
+
+BENCHMARK_CASES = [
+    ('refresh_dashboard_cold', 'Refresh Dashboard (cold)'),
+    ('refresh_dashboard_warm', 'Refresh Dashboard (cached)'),
+    ('route_dashboard', '/clinic/kpi/dashboard'),
+    ('route_data', '/clinic/kpi/data'),
+    ('route_export_series', '/clinic/kpi/export/series'),
+    ('check_doctor_availability', 'Appointment Availability Check'),
+    ('check_duplicate_attendance', 'Duplicate Attendance Check'),
+    ('check_leave_dates', 'Leave Overlap Check'),
+    ('patient_name_search', 'Patient Lookup by Name'),
+    ('patient_phone_search', 'Patient Lookup by Phone'),
+]
+
+
+class ClinicBenchmark(models.TransientModel):
+    _name = 'clinic.benchmark'
+    _description = 'Clinic Benchmark'
+
+    scale = fields.Integer(string='Appointments', required=True, default=10000,
+                           help='Number of appointments to generate; the other records are derived from it.')
+    seed = fields.Integer(string='Random Seed', default=42)
+    repeat = fields.Integer(string='Runs per Case', required=True, default=3,
+                            help='Each case is run this many times and the median run is stored.')
+    sample_size = fields.Integer(string='Constraint Sample', required=True, default=200,
+                                 help='Number of records whose constraints are checked per run.')
+
+    @api.constrains('scale')
+    def _check_scale(self):
+        for record in self:
+            if not 10000 <= record.scale <= 5000000:
+                raise ValidationError(_('The benchmark scale must be between 10,000 and 5,000,000 appointments.'))
+
+    @api.constrains('repeat', 'sample_size')
+    def _check_repeat(self):
+        for record in self:
+            if record.repeat < 1 or record.sample_size < 1:
+                raise ValidationError(_('Runs per case and constraint sample must be positive.'))
+
+    def action_generate_data(self):
+        self.ensure_one()
+        self._generate_data(self.scale, self.seed)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Success'),
+                'message': _('Benchmark data generated'),
+                'type': 'success',
+            }
+        }
+
+    def action_run_benchmarks(self):
+        self.ensure_one()
+        self._run_benchmarks(self.repeat, self.sample_size)
+        return self.env['ir.actions.act_window']._for_xml_id(
+            'clinic_management_system.action_clinic_benchmark_result')
+
+    def action_purge_data(self):
+        self.ensure_one()
+        self._purge_data()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Success'),
+                'message': _('Benchmark data removed'),
+                'type': 'success',
+            }
+        }
+
+    # ------------------------------------------------------------------
+    # Data generation
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_volumes(self, scale):
+        """Row counts of every generated model for a number of appointments"""
+        doctors = max(10, scale // 4000)
+        return {
+            'appointments': scale,
+            'doctors': doctors,
+            'patients': max(1000, scale // 4),
+            'wards': max(4, scale // 100000),
+            'cabins': max(10, scale // 20000),
+            'staff': min(500, max(20, scale // 10000)),
+            # Working days needed to fit every appointment in the doctors' slots
+            'days': math.ceil(scale / (doctors * _SLOTS_PER_DAY)),
+        }
+
+    @api.model
+    def _generate_data(self, scale, seed=42):
+        """Generate a realistic data set of ``scale`` appointments.
+
+        Rows are inserted with set-based SQL so millions of them take
+        minutes, with their stored computed fields filled in the same
+        statements. Previously generated data is removed first.
+        """
+        self._purge_data()
+        volumes = self._get_volumes(scale)
+        today = fields.Date.context_today(self)
+        monday = today - timedelta(days=today.weekday())
+        start = monday - timedelta(weeks=math.ceil(volumes['days'] / 5))
+        names = self._get_patient_names(volumes['patients'])
+        params = dict(volumes, prefix=BENCHMARK_PREFIX, like=BENCHMARK_PREFIX + '%',
+                      slots=_SLOTS_PER_DAY, start=start, today=today, uid=self.env.uid,
+                      patient_names=names, patient_phonetics=[phonetic_key(name) for name in names])
+
+        cr = self.env.cr
+        cr.execute("SELECT setseed(%s)", [(seed % 1000) / 1000.0])
+        for step in ('doctors', 'wards', 'cabins', 'patients', 'appointments',
+                     'prescriptions', 'lab_tests'):
+            _logger.info("Generating benchmark %s", step)
+            cr.execute(getattr(self, '_get_%s_query' % step)(), params)
+
+        staff = self.env['hr.employee'].create([
+            {'name': '%s %d' % (BENCHMARK_STAFF, i)} for i in range(1, volumes['staff'] + 1)
+        ])
+        self.env.flush_all()
+        params['employee_ids'] = staff.ids
+        for step in ('attendance', 'leaves', 'payroll'):
+            _logger.info("Generating benchmark %s", step)
+            cr.execute(getattr(self, '_get_%s_query' % step)(), params)
+
+        self.env.invalidate_all()
+        self.env['clinic.doctor'].search([('license_number', '=like', BENCHMARK_PREFIX + '%')])._mark_availability_dirty()
+        self.env['clinic.kpi.daily']._refresh_days()
+        self.env['clinic.kpi']._invalidate_kpi_cache()
+        return volumes
+
+    def _get_doctors_query(self):
+        return """
+            INSERT INTO clinic_doctor (
+                name, gender, phone, specialization, license_number, joining_date, age, birthday_key,
+                consultation_fee, consultation_duration, monday_available, tuesday_available,
+                wednesday_available, thursday_available, friday_available, saturday_available,
+                sunday_available, working_hours_start, working_hours_end, active, state,
+                create_uid, create_date, write_uid, write_date)
+            SELECT 'Dr. Benchmark ' || i, (ARRAY['male', 'female'])[1 + mod(i, 2)],
+                   '+1555' || lpad(i::text, 7, '0'),
+                   (ARRAY['general', 'cardiology', 'neurology', 'orthopedics', 'pediatrics',
+                          'gynecology', 'dermatology', 'psychiatry', 'radiology', 'surgery'])[1 + mod(i, 10)],
+                   %(prefix)s || 'DOC' || lpad(i::text, 7, '0'), %(start)s, 0, 0,
+                   50 + 10 * mod(i, 16), 30, true, true, true, true, true, false, false,
+                   9.0, 17.0, true, 'available',
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM generate_series(1, %(doctors)s) i
+        """
+
+    def _get_wards_query(self):
+        return """
+            INSERT INTO clinic_ward (
+                ward_number, name, ward_type, floor, bed_capacity, daily_rate, status, active,
+                create_uid, create_date, write_uid, write_date)
+            SELECT %(prefix)s || 'WRD' || lpad(i::text, 5, '0'), 'Benchmark Ward ' || i,
+                   (ARRAY['general', 'male', 'female', 'pediatric', 'maternity',
+                          'surgical', 'icu', 'emergency'])[1 + mod(i, 8)],
+                   1 + mod(i, 5), 20, 100 + 25 * mod(i, 4), 'available', true,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM generate_series(1, %(wards)s) i
+        """
+
+    def _get_cabins_query(self):
+        return """
+            INSERT INTO clinic_cabin (
+                cabin_number, name, cabin_type, floor, bed_capacity, daily_rate, status, active,
+                create_uid, create_date, write_uid, write_date)
+            SELECT %(prefix)s || 'CAB' || lpad(i::text, 5, '0'), 'Benchmark Cabin ' || i,
+                   (ARRAY['general', 'private', 'deluxe', 'icu', 'emergency'])[1 + mod(i, 5)],
+                   1 + mod(i, 5), 1 + mod(i, 2), 300 + 100 * mod(i, 5), 'available', true,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM generate_series(1, %(cabins)s) i
+        """
+
+    @api.model
+    def _get_patient_names(self, count):
+        """Distinct patient names, a first name and last names spelling each index,
+        so the duplicate finder only matches patients by chance as in real data
+        """
+        names = []
+        for i in range(count):
+            words = [_FIRST_NAMES[i % len(_FIRST_NAMES)]]
+            i //= len(_FIRST_NAMES)
+            while True:
+                words.append(_LAST_NAMES[i % len(_LAST_NAMES)])
+                i //= len(_LAST_NAMES)
+                if not i:
+                    break
+            names.append(' '.join(words))
+        return names
+
+    def _get_patients_query(self):
+        # The first patients fill 3/4 of the ward beds, the next ones one bed per cabin
+        return """
+            INSERT INTO clinic_patient (
+                name, name_phonetic, patient_id, gender, date_of_birth, age, birthday_key, blood_group, phone, phone_normalized,
+                height, weight, bmi, active, is_admitted, admission_date, ward_id, cabin_id,
+                create_uid, create_date, write_uid, write_date)
+            SELECT name, name_phonetic, %(prefix)s || 'PAT' || lpad(i::text, 7, '0'),
+                   gender, dob, date_part('year', age(%(today)s, dob))::int,
+                   date_part('month', dob)::int * 100 + date_part('day', dob)::int, blood_group,
+                   '+1666' || lpad(i::text, 7, '0'), '1666' || lpad(i::text, 7, '0'),
+                   height, weight, round((weight / (height * height / 10000.0))::numeric, 2),
+                   true, ward_id IS NOT NULL OR cabin_id IS NOT NULL,
+                   CASE WHEN ward_id IS NOT NULL OR cabin_id IS NOT NULL THEN %(today)s END,
+                   ward_id, cabin_id,
+                   %(uid)s, created, %(uid)s, created
+            FROM (
+                SELECT i, name, name_phonetic,
+                       (ARRAY['male', 'female', 'other'])[1 + mod(i, 3)] AS gender,
+                       date '1940-01-01' + (random() * 29000)::int AS dob,
+                       (ARRAY['a+', 'a-', 'b+', 'b-', 'ab+', 'ab-', 'o+', 'o-'])[1 + mod(i, 8)] AS blood_group,
+                       round((150 + random() * 40)::numeric, 1)::float AS height,
+                       round((50 + random() * 50)::numeric, 1)::float AS weight,
+                       CASE WHEN i <= wards.n * 15 THEN wards.ids[1 + mod(i, wards.n)] END AS ward_id,
+                       CASE WHEN i > wards.n * 15 AND i <= wards.n * 15 + cabins.n
+                            THEN cabins.ids[i - wards.n * 15] END AS cabin_id,
+                       %(start)s::timestamp + random() * (%(today)s::timestamp - %(start)s::timestamp) AS created
+                FROM unnest(%(patient_names)s::varchar[], %(patient_phonetics)s::varchar[])
+                         WITH ORDINALITY AS names(name, name_phonetic, i),
+                     (SELECT array_agg(id ORDER BY id) AS ids, count(*)::int AS n
+                      FROM clinic_ward WHERE ward_number LIKE %(like)s) wards,
+                     (SELECT array_agg(id ORDER BY id) AS ids, count(*)::int AS n
+                      FROM clinic_cabin WHERE cabin_number LIKE %(like)s) cabins
+            ) src;
+
+            UPDATE clinic_ward ward SET status = CASE WHEN occupied.n >= ward.bed_capacity THEN 'full' ELSE 'available' END
+            FROM (SELECT ward_id, count(*) AS n FROM clinic_patient WHERE ward_id IS NOT NULL GROUP BY ward_id) occupied
+            WHERE occupied.ward_id = ward.id AND ward.ward_number LIKE %(like)s;
+
+            UPDATE clinic_cabin cabin SET status = CASE WHEN occupied.n >= cabin.bed_capacity THEN 'occupied' ELSE 'available' END
+            FROM (SELECT cabin_id, count(*) AS n FROM clinic_patient WHERE cabin_id IS NOT NULL GROUP BY cabin_id) occupied
+            WHERE occupied.cabin_id = cabin.id AND cabin.cabin_number LIKE %(like)s;
+        """
+
+    def _get_appointments_query(self):
+        # Appointment i goes to doctor i mod n in that doctor's next free slot,
+        # so appointments never overlap and only fall on working days
+        return """
+            INSERT INTO clinic_appointment (
+                appointment_number, patient_id, patient_age, doctor_id, doctor_specialization,
+                appointment_date, appointment_time, appointment_end_time, duration, appointment_type, priority,
+                consultation_fee, additional_charges, total_amount, paid_amount, balance,
+                payment_status, state, reminder_sent,
+                create_uid, create_date, write_uid, write_date)
+            SELECT %(prefix)s || 'APT' || lpad(src.i::text, 7, '0'), patient.id, patient.age,
+                   doctor.id, doctor.specialization,
+                   %(start)s::date + (src.day / 5) * 7 + mod(src.day, 5),
+                   src.time, src.time + 0.5, 30,
+                   (ARRAY['consultation', 'follow_up', 'emergency', 'checkup'])[1 + mod(src.i, 4)::int],
+                   CASE WHEN mod(src.i, 4) = 2 THEN '2' ELSE '0' END,
+                   doctor.consultation_fee, src.additional, doctor.consultation_fee + src.additional,
+                   CASE WHEN src.state = 'done' THEN doctor.consultation_fee + src.additional ELSE 0 END,
+                   CASE WHEN src.state = 'done' THEN 0 ELSE doctor.consultation_fee + src.additional END,
+                   CASE WHEN src.state = 'done' THEN 'paid' ELSE 'unpaid' END,
+                   src.state, src.state = 'done',
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM (
+                SELECT i,
+                       doctors.ids[(1 + mod(i, doctors.n))::int] AS doctor_id,
+                       patients.ids[(1 + mod(i * 7919, patients.n))::int] AS patient_id,
+                       ((i / doctors.n) / %(slots)s)::int AS day,
+                       9.0 + mod(i / doctors.n, %(slots)s) * 0.5 AS time,
+                       CASE WHEN random() < 0.5 THEN 0 ELSE round((random() * 50)::numeric, 2)::float END AS additional,
+                       (ARRAY['done', 'done', 'done', 'done', 'done', 'done', 'done',
+                              'cancelled', 'confirmed', 'draft'])[1 + floor(random() * 10)::int] AS state
+                FROM generate_series(0, %(appointments)s::bigint - 1) i,
+                     (SELECT array_agg(id ORDER BY id) AS ids, count(*) AS n
+                      FROM clinic_doctor WHERE license_number LIKE %(like)s) doctors,
+                     (SELECT array_agg(id ORDER BY id) AS ids, count(*) AS n
+                      FROM clinic_patient WHERE patient_id LIKE %(like)s) patients
+            ) src
+            JOIN clinic_doctor doctor ON doctor.id = src.doctor_id
+            JOIN clinic_patient patient ON patient.id = src.patient_id;
+
+            UPDATE clinic_patient patient
+            SET total_visits = visits.n, last_visit_date = visits.last_date, total_amount_paid = visits.amount
+            FROM (SELECT patient_id, count(*) AS n, max(appointment_date) AS last_date, sum(total_amount) AS amount
+                  FROM clinic_appointment
+                  WHERE state = 'done' AND appointment_number LIKE %(like)s
+                  GROUP BY patient_id) visits
+            WHERE visits.patient_id = patient.id AND patient.patient_id LIKE %(like)s;
+        """
+
+    def _get_prescriptions_query(self):
+        # Every other completed appointment gets a prescription with two medicines
+        return """
+            INSERT INTO clinic_prescription (
+                prescription_number, patient_id, doctor_id, appointment_id, prescription_date,
+                diagnosis, temperature, pulse_rate, follow_up_required, lab_test_required, state,
+                create_uid, create_date, write_uid, write_date)
+            SELECT %(prefix)s || 'PRE' || lpad(row_number() OVER (ORDER BY id)::text, 7, '0'),
+                   patient_id, doctor_id, id, appointment_date,
+                   (ARRAY['Hypertension', 'Influenza', 'Migraine', 'Diabetes', 'Gastritis'])[1 + mod(id, 5)],
+                   98.6, 72, mod(id, 3) = 0, mod(id, 4) = 0, 'dispensed',
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM clinic_appointment
+            WHERE appointment_number LIKE %(like)s AND state = 'done' AND mod(id, 2) = 0;
+
+            INSERT INTO clinic_prescription_line (
+                prescription_id, medicine_name, dosage, frequency, duration, quantity, route,
+                create_uid, create_date, write_uid, write_date)
+            SELECT prescription.id,
+                   (ARRAY['Paracetamol', 'Amoxicillin', 'Ibuprofen', 'Omeprazole', 'Metformin',
+                          'Amlodipine', 'Cetirizine'])[1 + mod(prescription.id + line, 7)],
+                   (ARRAY['250mg', '500mg', '1 tablet'])[1 + mod(prescription.id, 3)],
+                   (ARRAY['once_daily', 'twice_daily', 'thrice_daily', 'after_meal'])[1 + mod(prescription.id + line, 4)],
+                   5 + mod(prescription.id, 10), 10 + mod(prescription.id, 20), 'oral',
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM clinic_prescription prescription, generate_series(1, 2) line
+            WHERE prescription.prescription_number LIKE %(like)s;
+        """
+
+    def _get_lab_tests_query(self):
+        # Every third appointment orders a lab test on the same day
+        return """
+            INSERT INTO clinic_lab_test (
+                test_number, patient_id, doctor_id, appointment_id, test_type, test_name,
+                test_date, result_date, state, test_cost, priority,
+                create_uid, create_date, write_uid, write_date)
+            SELECT %(prefix)s || 'LAB' || lpad(row_number() OVER (ORDER BY id)::text, 7, '0'),
+                   patient_id, doctor_id, id, test_type, initcap(replace(test_type, '_', ' ')) || ' Panel',
+                   appointment_date, CASE WHEN test_state = 'completed' THEN appointment_date END,
+                   test_state, test_cost,
+                   (ARRAY['normal', 'normal', 'normal', 'urgent', 'emergency'])[1 + mod(id, 5)],
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM (
+                SELECT id, patient_id, doctor_id, appointment_date,
+                       (ARRAY['blood', 'urine', 'xray', 'ct_scan', 'mri',
+                              'ultrasound', 'ecg', 'echo', 'other'])[1 + mod(id, 9)] AS test_type,
+                       (ARRAY[20, 15, 60, 250, 400, 120, 40, 180, 30])[1 + mod(id, 9)] AS test_cost,
+                       CASE state WHEN 'done' THEN 'completed'
+                                  WHEN 'cancelled' THEN 'cancelled'
+                                  WHEN 'confirmed' THEN 'sample_collected'
+                                  ELSE 'draft' END AS test_state
+                FROM clinic_appointment
+                WHERE appointment_number LIKE %(like)s AND mod(id, 3) = 0
+            ) src
+        """
+
+    def _get_attendance_query(self):
+        # One attendance per staff member and working day, checking in around 9:00
+        return """
+            INSERT INTO clinic_attendance (
+                employee_id, employee_type, attendance_date, check_in, check_out, worked_hours,
+                expected_hours, overtime_hours, status, is_late, late_minutes, shift,
+                create_uid, create_date, write_uid, write_date)
+            SELECT employee_id,
+                   (ARRAY['doctor', 'nurse', 'receptionist', 'technician', 'pharmacist',
+                          'admin', 'support'])[1 + mod(employee_id, 7)],
+                   day, check_in, check_out, worked, 8.0, GREATEST(worked - 8.0, 0),
+                   CASE WHEN worked >= 8.0 THEN 'present' ELSE 'half_day' END,
+                   late > 0, GREATEST(late, 0), 'morning',
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM (
+                SELECT employee_id, day, check_in, check_out,
+                       extract(epoch FROM check_out - check_in) / 3600.0 AS worked,
+                       (extract(hour FROM check_in) - 9) * 60 + extract(minute FROM check_in) AS late
+                FROM (
+                    SELECT employee_id, day::date AS day, check_in,
+                           check_in + interval '6 hours' + random() * interval '4 hours' AS check_out
+                    FROM (
+                        SELECT employee_id, day,
+                               day + interval '8 hours 40 minutes' + random() * interval '40 minutes' AS check_in
+                        FROM unnest(%(employee_ids)s::int[]) employee_id,
+                             generate_series(%(start)s::timestamp, %(today)s::timestamp, interval '1 day') day
+                        WHERE extract(isodow FROM day) < 6
+                    ) checked_in
+                ) checked_out
+            ) src
+        """
+
+    def _get_leaves_query(self):
+        # One approved leave of one to three days per staff member and quarter
+        return """
+            INSERT INTO clinic_leave (
+                leave_number, employee_id, leave_type, request_date, start_date, end_date,
+                number_of_days, reason, state, approval_date,
+                create_uid, create_date, write_uid, write_date)
+            SELECT %(prefix)s || 'LVE' || lpad(row_number() OVER (ORDER BY employee_id, quarter)::text, 7, '0'),
+                   employee_id, (ARRAY['sick', 'casual', 'annual', 'emergency'])[1 + mod(employee_id + quarter, 4)],
+                   start_date - 7, start_date, start_date + length - 1, length,
+                   'Benchmark leave', 'approved', start_date - 5,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM (
+                SELECT employee_id, quarter, 1 + mod(employee_id + quarter, 3) AS length,
+                       %(start)s::date + quarter * 91 + mod(employee_id, 60) AS start_date
+                FROM unnest(%(employee_ids)s::int[]) employee_id,
+                     generate_series(0, (%(today)s::date - %(start)s::date) / 91) quarter
+            ) src
+            WHERE start_date <= %(today)s
+        """
+
+    def _get_payroll_query(self):
+        # One paid payslip per staff member at the end of every completed month
+        return """
+            INSERT INTO clinic_payroll (
+                payroll_number, employee_id, employee_type, payment_month, payment_year, payment_date,
+                basic_salary, house_allowance, medical_allowance, transport_allowance, total_earnings,
+                tax_deduction, total_deductions, net_salary, working_days, present_days, absent_days,
+                overtime_hours, overtime_rate, overtime_amount, payment_method, state,
+                create_uid, create_date, write_uid, write_date)
+            SELECT %(prefix)s || 'PAY' || lpad(row_number() OVER (ORDER BY employee_id, period)::text, 7, '0'),
+                   employee_id,
+                   (ARRAY['doctor', 'nurse', 'receptionist', 'technician', 'pharmacist',
+                          'admin', 'support'])[1 + mod(employee_id, 7)],
+                   (ARRAY['january', 'february', 'march', 'april', 'may', 'june', 'july',
+                          'august', 'september', 'october', 'november', 'december'])[extract(month FROM period)::int],
+                   extract(year FROM period)::int, (period + interval '1 month' - interval '1 day')::date,
+                   basic, basic * 0.2, basic * 0.05, basic * 0.03, basic * 1.28,
+                   basic * 0.1, basic * 0.1, basic * 1.18, 26, 24, 2,
+                   0, 0, 0, 'bank_transfer', 'paid',
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM (
+                SELECT employee_id, period, 3000 + 500 * mod(employee_id, 12) AS basic
+                FROM unnest(%(employee_ids)s::int[]) employee_id,
+                     generate_series(date_trunc('month', %(start)s::timestamp),
+                                     %(today)s::timestamp, interval '1 month') period
+            ) src
+            WHERE period + interval '1 month' - interval '1 day' <= %(today)s
+        """
+
+    @api.model
+    def _purge_data(self):
+        """Remove every record created by _generate_data"""
+        self.env.flush_all()
+        cr = self.env.cr
+        staff = self.env['hr.employee'].with_context(active_test=False).search([
+            ('name', '=like', BENCHMARK_STAFF + ' %'),
+        ])
+        like = BENCHMARK_PREFIX + '%'
+        for query in (
+            "DELETE FROM clinic_prescription WHERE prescription_number LIKE %(like)s",
+            "DELETE FROM clinic_lab_test WHERE test_number LIKE %(like)s",
+            "DELETE FROM clinic_appointment WHERE appointment_number LIKE %(like)s",
+            "DELETE FROM clinic_patient WHERE patient_id LIKE %(like)s",
+            "DELETE FROM clinic_doctor WHERE license_number LIKE %(like)s",
+            "DELETE FROM clinic_cabin WHERE cabin_number LIKE %(like)s",
+            "DELETE FROM clinic_ward WHERE ward_number LIKE %(like)s",
+            "DELETE FROM clinic_attendance WHERE employee_id = ANY(%(staff)s)",
+            "DELETE FROM clinic_leave WHERE employee_id = ANY(%(staff)s)",
+            "DELETE FROM clinic_payroll WHERE employee_id = ANY(%(staff)s)",
+        ):
+            cr.execute(query, {'like': like, 'staff': staff.ids})
+        self.env.invalidate_all()
+        staff.unlink()
+        self.env['clinic.kpi.daily']._refresh_days()
+        self.env['clinic.kpi']._invalidate_kpi_cache()
+
+    # ------------------------------------------------------------------
+    # Benchmarks
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_benchmark_cases(self, sample_size):
+        """Return ``(case, setup, run)`` triples; only ``run`` is measured"""
+        kpi_model = self.env['clinic.kpi']
+        today = fields.Date.context_today(self)
+        self.env.cr.execute("SELECT min(appointment_date) FROM clinic_appointment")
+        date_from = self.env.cr.fetchone()[0] or today.replace(day=1)
+        kpi = kpi_model.new({'date_from': date_from, 'date_to': today})
+        dbname = self.env.cr.dbname
+
+        def drop_cache():
+            kpi_cache.invalidate(dbname)
+            self.env.invalidate_all()
+
+        def warm_cache():
+            kpi_model._get_kpi_sections(date_from, today)
+            self.env.invalidate_all()
+
+        def render_dashboard():
+            record = kpi_model.new({'date_from': date_from, 'date_to': today})
+            for name, field in kpi_model._fields.items():
+                if field.compute:
+                    record[name]
+
+        def read_data():
+            kpi_model._get_dashboard_data(date_from, today)
+            kpi_model._get_kpi_growth(date_from, today)
+
+        def export_series():
+            for dummy in self.env['clinic.kpi.daily']._iter_series(date_from, today, 'doctor'):
+                pass
+
+        def sample(model):
+            return self.env[model].search([], limit=sample_size, order='id desc')
+
+        return [
+            ('refresh_dashboard_cold', drop_cache, kpi.action_refresh_dashboard),
+            ('refresh_dashboard_warm', warm_cache, kpi.action_refresh_dashboard),
+            ('route_dashboard', drop_cache, render_dashboard),
+            ('route_data', drop_cache, read_data),
+            ('route_export_series', drop_cache, export_series),
+            ('check_doctor_availability', self.env.invalidate_all,
+             lambda: sample('clinic.appointment')._check_doctor_availability()),
+            ('check_duplicate_attendance', self.env.invalidate_all,
+             lambda: sample('clinic.attendance')._check_duplicate_attendance()),
+            ('check_leave_dates', self.env.invalidate_all,
+             lambda: sample('clinic.leave')._check_dates()),
+            ('patient_name_search', self.env.invalidate_all,
+             lambda: self.env['clinic.patient'].name_search('Patient 4242', limit=8)),
+            ('patient_phone_search', self.env.invalidate_all,
+             lambda: self.env['clinic.patient'].name_search('666 0004', limit=8)),
+        ]
+
+    @api.model
+    def _run_benchmarks(self, repeat=3, sample_size=200):
+        """Time every benchmark case and store the median run of each"""
+        self.env['clinic.kpi.daily']._flush_dirty()
+        self.env.flush_all()
+        module = self.env['ir.module.module'].sudo().search([('name', '=', 'clinic_management_system')], limit=1)
+        scale = self.env['clinic.appointment'].search_count([])
+        results = []
+        for case, setup, run in self._get_benchmark_cases(sample_size):
+            runs = []
+            for dummy in range(repeat):
+                setup()
+                with _SectionProfiler(self.env) as profiler:
+                    run()
+                runs.append(profiler)
+            runs.sort(key=lambda run_profile: run_profile.wall_time)
+            profiler = runs[(len(runs) - 1) // 2]
+            results.append({
+                'case': case,
+                'version': module.latest_version or module.installed_version,
+                'scale': scale,
+                'repeat': repeat,
+                'wall_time': round(profiler.wall_time * 1000, 3),
+                'query_count': profiler.query_count,
+                'row_count': profiler.row_count,
+            })
+            _logger.info("Benchmark %s: %.3f ms, %d queries", case, results[-1]['wall_time'], profiler.query_count)
+        return self.env['clinic.benchmark.result'].sudo().create(results)
+
+
+class ClinicBenchmarkResult(models.Model):
+    _name = 'clinic.benchmark.result'
+    _description = 'Clinic Benchmark Result'
+    _rec_name = 'case'
+    _order = 'run_date desc, id'
+
+    run_date = fields.Datetime(string='Run Date', required=True, readonly=True, default=fields.Datetime.now)
+    user_id = fields.Many2one('res.users', string='User', readonly=True, default=lambda self: self.env.user)
+    version = fields.Char(string='Module Version', readonly=True)
+    scale = fields.Integer(string='Appointments', readonly=True, group_operator='max')
+    case = fields.Selection(BENCHMARK_CASES, string='Case', required=True, readonly=True)
+    repeat = fields.Integer(string='Runs', readonly=True, group_operator='max')
+
+    wall_time = fields.Float(string='Wall Time (ms)', readonly=True, group_operator='avg')
+    query_count = fields.Integer(string='SQL Queries', readonly=True, group_operator='avg')
+    row_count = fields.Integer(string='Rows Fetched', readonly=True, group_operator='avg')
@@ -7,8 +7,10 @@ from odoo.exceptions import ValidationError
 class ClinicCabin(models.Model):
     _name = 'clinic.cabin'
     _description = 'Cabin/Room'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.kpi.source.mixin']
     _rec_name = 'cabin_number'
+    _kpi_fields = ('bed_capacity', 'active')
+    _kpi_sections = ('occupancy',)
 
     cabin_number = fields.Char(string='Cabin Number', required=True, tracking=True)
     name = fields.Char(string='Cabin Name')
@@ -94,8 +96,10 @@ class ClinicCabin(models.Model):
 class ClinicWard(models.Model):
     _name = 'clinic.ward'
     _description = 'Ward'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.kpi.source.mixin']
     _rec_name = 'ward_number'
+    _kpi_fields = ('bed_capacity', 'active')
+    _kpi_sections = ('occupancy',)
 
     ward_number = fields.Char(string='Ward Number', required=True, tracking=True)
     name = fields.Char(string='Ward Name', required=True)
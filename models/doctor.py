@@ -2,16 +2,33 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from datetime import timedelta
+
+# Weekday availability flags, indexed by date.weekday()
+WEEKDAY_FIELDS = [
+    'monday_available', 'tuesday_available', 'wednesday_available', 'thursday_available',
+    'friday_available', 'saturday_available', 'sunday_available',
+]
+
+# Fields whose change alters the compiled availability of a doctor
+_AVAILABILITY_FIELDS = WEEKDAY_FIELDS + ['working_hours_start', 'working_hours_end', 'schedule_template_id', 'active']
+
+_AVAILABILITY_DIRTY_KEY = 'clinic.doctor.availability.dirty'
 
 
 class ClinicDoctor(models.Model):
     _name = 'clinic.doctor'
     _description = 'Doctor'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.kpi.source.mixin', 'clinic.age.mixin']
     _rec_name = 'name'
+    _kpi_fields = ('active',)
+    _kpi_sections = ('doctor',)
 
     name = fields.Char(string='Name', required=True, tracking=True)
-    image = fields.Binary(string='Photo')
+    # Photos are stored as attachments; lists and avatars load the thumbnails by URL
+    image = fields.Image(string='Photo', max_width=1920, max_height=1920)
+    image_512 = fields.Image(string='Photo 512', related='image', max_width=512, max_height=512, store=True)
+    image_128 = fields.Image(string='Photo 128', related='image', max_width=128, max_height=128, store=True)
     user_id = fields.Many2one('res.users', string='Related User', ondelete='cascade')
     gender = fields.Selection([
         ('male', 'Male'),
@@ -19,7 +36,6 @@ class ClinicDoctor(models.Model):
         ('other', 'Other')
     ], string='Gender', required=True)
     date_of_birth = fields.Date(string='Date of Birth')
-    age = fields.Integer(string='Age', compute='_compute_age', store=True)
     phone = fields.Char(string='Phone', required=True)
     email = fields.Char(string='Email')
     address = fields.Text(string='Address')
@@ -59,6 +75,10 @@ class ClinicDoctor(models.Model):
     working_hours_start = fields.Float(string='Working Hours Start', default=9.0)
     working_hours_end = fields.Float(string='Working Hours End', default=17.0)
 
+    # A schedule template replaces the weekday flags and working hours above
+    schedule_template_id = fields.Many2one('clinic.schedule.template', string='Schedule Template', tracking=True)
+    schedule_exception_ids = fields.One2many('clinic.schedule.exception', 'doctor_id', string='Schedule Exceptions')
+
     # Relations
     appointment_ids = fields.One2many('clinic.appointment', 'doctor_id', string='Appointments')
     prescription_ids = fields.One2many('clinic.prescription', 'doctor_id', string='Prescriptions')
@@ -75,16 +95,27 @@ class ClinicDoctor(models.Model):
     total_appointments = fields.Integer(string='Total Appointments', compute='_compute_statistics')
     total_patients = fields.Integer(string='Total Patients', compute='_compute_statistics')
 
-    @api.depends('date_of_birth')
-    def _compute_age(self):
-        for record in self:
-            if record.date_of_birth:
-                today = fields.Date.today()
-                record.age = today.year - record.date_of_birth.year - (
-                        (today.month, today.day) < (record.date_of_birth.month, record.date_of_birth.day)
-                )
-            else:
-                record.age = 0
+    @api.model_create_multi
+    def create(self, vals_list):
+        doctors = super(ClinicDoctor, self).create(vals_list)
+        doctors._mark_availability_dirty()
+        return doctors
+
+    def write(self, vals):
+        res = super(ClinicDoctor, self).write(vals)
+        if any(fname in vals for fname in _AVAILABILITY_FIELDS):
+            self._mark_availability_dirty()
+        if 'consultation_fee' in vals:
+            self._mark_fee_days_dirty()
+        return res
+
+    def _mark_fee_days_dirty(self):
+        """Completed appointments total the fee of their doctor, so a new fee
+        changes the consultation revenue of their days"""
+        days = self.env['clinic.appointment']._read_group(
+            [('doctor_id', 'in', self.ids), ('state', '=', 'done')], ['appointment_date:day'])
+        self.env['clinic.kpi.daily']._mark_dirty('clinic_appointment', [day for day, in days])
+        self.env['clinic.kpi']._invalidate_kpi_cache(['revenue', 'financial'])
 
     def _compute_statistics(self):
         for record in self:
@@ -112,4 +143,215 @@ class ClinicDoctor(models.Model):
             'view_mode': 'tree,form,calendar',
             'domain': [('doctor_id', '=', self.id)],
             'context': {'default_doctor_id': self.id}
-        }
\ No newline at end of file
+        }
+
+    # ------------------------------------------------------------------
+    # Availability
+    # ------------------------------------------------------------------
+
+    def _compile_availability(self, date_from, date_to):
+        """Evaluate the schedules of the doctors into ``{(doctor_id, date): [(from, to)]}``.
+
+        Exceptions win over the schedule template, which wins over the weekday
+        flags and working hours. Archived doctors and days without intervals
+        are left out.
+        """
+        doctors = self.filtered('active')
+        exceptions = {}
+        for exception in self.env['clinic.schedule.exception'].search_fetch([
+            ('doctor_id', 'in', doctors.ids),
+            ('date_from', '<=', date_to),
+            ('date_to', '>=', date_from),
+        ], ['doctor_id', 'date_from', 'date_to', 'exception_type', 'hour_from', 'hour_to']):
+            exceptions.setdefault(exception.doctor_id.id, []).append(exception)
+
+        days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+        availability = {}
+        for doctor in doctors:
+            weekly = {weekday: [] for weekday in range(7)}
+            if doctor.schedule_template_id:
+                for line in doctor.schedule_template_id.line_ids:
+                    weekly[int(line.weekday)].append((line.hour_from, line.hour_to))
+            else:
+                for weekday, fname in enumerate(WEEKDAY_FIELDS):
+                    if doctor[fname]:
+                        weekly[weekday].append((doctor.working_hours_start, doctor.working_hours_end))
+
+            for day in days:
+                intervals = weekly[day.weekday()]
+                day_exceptions = [exception for exception in exceptions.get(doctor.id, [])
+                                  if exception.date_from <= day <= exception.date_to]
+                if any(exception.exception_type == 'unavailable' for exception in day_exceptions):
+                    intervals = []
+                elif day_exceptions:
+                    intervals = [(exception.hour_from, exception.hour_to) for exception in day_exceptions]
+                if intervals:
+                    availability[(doctor.id, day)] = sorted(intervals)
+        return availability
+
+    def _get_availability(self, date_from, date_to):
+        """Return ``{(doctor_id, date): [(from, to)]}`` for the doctors over a date range.
+
+        Days inside the precomputed horizon are read from
+        clinic.doctor.availability in one indexed query, the others are
+        compiled on the fly.
+        """
+        if not self:
+            return {}
+        self._flush_availability()
+        bounds = self._get_availability_bounds()
+        if not bounds:
+            return self._compile_availability(date_from, date_to)
+
+        stored_from, stored_to = max(date_from, bounds[0]), min(date_to, bounds[1])
+        if stored_from > stored_to:
+            return self._compile_availability(date_from, date_to)
+
+        availability = {}
+        self.env.cr.execute("""
+            SELECT doctor_id, date, hour_from, hour_to
+            FROM clinic_doctor_availability
+            WHERE doctor_id = ANY(%s) AND date >= %s AND date <= %s
+            ORDER BY doctor_id, date, hour_from
+        """, [self.ids, stored_from, stored_to])
+        for doctor_id, date, hour_from, hour_to in self.env.cr.fetchall():
+            availability.setdefault((doctor_id, date), []).append((hour_from, hour_to))
+        if date_from < stored_from:
+            availability.update(self._compile_availability(date_from, stored_from - timedelta(days=1)))
+        if date_to > stored_to:
+            availability.update(self._compile_availability(stored_to + timedelta(days=1), date_to))
+        return availability
+
+    @api.model
+    def _get_availability_bounds(self):
+        params = self.env['ir.config_parameter'].sudo()
+        date_from = params.get_param('clinic_management_system.availability_from')
+        date_to = params.get_param('clinic_management_system.availability_to')
+        if not date_from or not date_to:
+            return None
+        return fields.Date.to_date(date_from), fields.Date.to_date(date_to)
+
+    def _mark_availability_dirty(self):
+        """Queue the doctors whose precomputed availability must be rebuilt before commit"""
+        if not self:
+            return
+        data = self.env.cr.precommit.data
+        dirty = data.get(_AVAILABILITY_DIRTY_KEY)
+        if dirty is None:
+            dirty = data[_AVAILABILITY_DIRTY_KEY] = set()
+            self.env.cr.precommit.add(self._flush_availability)
+        dirty.update(self.ids)
+
+    @api.model
+    def _flush_availability(self):
+        dirty = self.env.cr.precommit.data.pop(_AVAILABILITY_DIRTY_KEY, None)
+        if dirty:
+            doctors = self.with_context(active_test=False).browse(dirty).exists()
+            bounds = self._get_availability_bounds()
+            if bounds:
+                doctors._store_availability(*bounds)
+
+    def _store_availability(self, date_from, date_to):
+        """Replace the precomputed availability of the doctors over a date range"""
+        self.env.flush_all()
+        cr = self.env.cr
+        cr.execute("""
+            DELETE FROM clinic_doctor_availability
+            WHERE doctor_id = ANY(%s) AND date >= %s AND date <= %s
+        """, [self.ids, date_from, date_to])
+        rows = [(doctor_id, date, hour_from, hour_to)
+                for (doctor_id, date), intervals in self._compile_availability(date_from, date_to).items()
+                for hour_from, hour_to in intervals]
+        if rows:
+            doctor_ids, dates, hours_from, hours_to = zip(*rows)
+            cr.execute("""
+                INSERT INTO clinic_doctor_availability (doctor_id, date, hour_from, hour_to)
+                SELECT * FROM unnest(%s::int[], %s::date[], %s::float[], %s::float[])
+            """, [list(doctor_ids), list(dates), list(hours_from), list(hours_to)])
+        self.env['clinic.doctor.availability'].invalidate_model()
+
+    @api.model
+    def _cron_refresh_availability(self):
+        """Rebuild the availability of every doctor over the rolling horizon"""
+        params = self.env['ir.config_parameter'].sudo()
+        horizon = int(params.get_param('clinic_management_system.availability_horizon', 180))
+        today = fields.Date.context_today(self)
+        date_from, date_to = today - timedelta(days=30), today + timedelta(days=horizon)
+
+        self.env.cr.precommit.data.pop(_AVAILABILITY_DIRTY_KEY, None)
+        self.env.flush_all()
+        self.env.cr.execute("DELETE FROM clinic_doctor_availability")
+        self.with_context(active_test=False).search([])._store_availability(date_from, date_to)
+        params.set_param('clinic_management_system.availability_from', fields.Date.to_string(date_from))
+        params.set_param('clinic_management_system.availability_to', fields.Date.to_string(date_to))
+
+    @api.model
+    def _get_free_slots(self, date_from, date_to, duration=None, specialization=None):
+        """Return the bookable slots of every matching doctor over a date range.
+
+        Booked intervals of all doctors are loaded in one query and
+        subtracted in memory from each day's availability intervals.
+        ``duration`` is in minutes and defaults to each doctor's consultation
+        duration. Returns a list of ``{'doctor_id', 'doctor', 'slots'}``
+        where each slot is ``{'date', 'start', 'end'}`` in hours.
+        """
+        domain = [('specialization', '=', specialization)] if specialization else []
+        doctors = self.search(domain, order='name')
+        if not doctors:
+            return []
+
+        booked = {}
+        appointments = self.env['clinic.appointment'].search_fetch([
+            ('doctor_id', 'in', doctors.ids),
+            ('appointment_date', '>=', date_from),
+            ('appointment_date', '<=', date_to),
+            ('state', '!=', 'cancelled'),
+        ], ['doctor_id', 'appointment_date', 'appointment_time', 'appointment_end_time'])
+        for appointment in appointments:
+            booked.setdefault((appointment.doctor_id.id, appointment.appointment_date), []).append(
+                (appointment.appointment_time, appointment.appointment_end_time))
+
+        availability = doctors._get_availability(date_from, date_to)
+
+        # Slots already in the past are not bookable
+        now = fields.Datetime.context_timestamp(self, fields.Datetime.now())
+        today, current_time = now.date(), now.hour + now.minute / 60.0
+
+        days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+        result = []
+        for doctor in doctors:
+            length = (duration or doctor.consultation_duration or 30) / 60.0
+            slots = []
+            for day in days:
+                if day < today:
+                    continue
+                for hour_from, hour_to in availability.get((doctor.id, day), []):
+                    if day == today:
+                        hour_from = max(hour_from, current_time)
+                    for slot_start, slot_end in self._split_free_time(
+                            hour_from, hour_to, booked.get((doctor.id, day), []), length):
+                        slots.append({
+                            'date': fields.Date.to_string(day),
+                            'start': slot_start,
+                            'end': slot_end,
+                        })
+            result.append({
+                'doctor_id': doctor.id,
+                'doctor': doctor.name,
+                'slots': slots,
+            })
+        return result
+
+    @api.model
+    def _split_free_time(self, start, end, booked, length):
+        """Yield consecutive ``(start, end)`` slots of ``length`` hours between
+        ``start`` and ``end`` that do not overlap any booked interval"""
+        cursor = start
+        for booked_start, booked_end in sorted(booked) + [(end, end)]:
+            # Fill the gap before this booking, then skip past it
+            while cursor + length <= min(booked_start, end) + 1e-9:
+                yield round(cursor, 4), round(cursor + length, 4)
+                cursor += length
+            cursor = max(cursor, booked_end)
+            if cursor >= end:
+                return
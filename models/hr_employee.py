@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+
+
+class HrEmployee(models.Model):
+    _name = 'hr.employee'
+    _inherit = ['hr.employee', 'clinic.kpi.source.mixin']
+    # Active employees are the staff headcount of the attendance section
+    _kpi_fields = ('active',)
+    _kpi_sections = ('attendance',)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+
+from .appointment import QUEUE_CHANNEL
+from .kpi import KPI_LIVE_CHANNEL
+
+# Channels only internal users may listen to
+_INTERNAL_CHANNELS = (KPI_LIVE_CHANNEL, QUEUE_CHANNEL)
+
+
+class IrWebsocket(models.AbstractModel):
+    _inherit = 'ir.websocket'
+
+    def _build_bus_channel_list(self, channels):
+        # Live KPI values and triage queues are only pushed to internal users
+        if any(channel in _INTERNAL_CHANNELS for channel in channels) \
+                and not self.env.user.has_group('base.group_user'):
+            channels = [channel for channel in channels if channel not in _INTERNAL_CHANNELS]
+        return super(IrWebsocket, self)._build_bus_channel_list(channels)
@@ -1,7 +1,55 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api, _
-from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from .kpi_cache import kpi_cache
+
+# Dashboard sections, in computation order: financial reuses revenue and patient values
+KPI_SECTIONS = ['patient', 'appointment', 'revenue', 'doctor', 'occupancy', 'attendance', 'lab', 'financial']
+
+# Additive KPIs and the fact columns they sum, compared across periods by _get_kpi_growth
+GROWTH_KPIS = {
+    'new_patients': ['new_patients'],
+    'total_appointments': ['appointment_count'],
+    'completed_appointments': ['appointment_done'],
+    'cancelled_appointments': ['appointment_cancelled'],
+    'total_revenue': ['consultation_revenue', 'lab_test_revenue'],
+    'consultation_revenue': ['consultation_revenue'],
+    'lab_test_revenue': ['lab_test_revenue'],
+    'total_overtime_hours': ['overtime_hours'],
+    'total_lab_tests': ['lab_test_count'],
+    'completed_lab_tests': ['lab_test_completed'],
+    'pending_lab_tests': ['lab_test_pending'],
+    'total_payroll': ['payroll_paid'],
+}
+
+_CACHE_INVALIDATION_KEY = 'clinic.kpi.cache.invalidate'
+# Per section count of the committed writes affecting it, shared by all workers
+_CACHE_GENERATION_TABLE = 'clinic_kpi_cache_generation'
+_LIVE_UPDATE_KEY = 'clinic.kpi.live.sections'
+
+# Bus channel of the live dashboards
+KPI_LIVE_CHANNEL = 'clinic_kpi'
+
+
+def _bump_cache_generations(registry, sections):
+    """Advance the cache generation of sections, once their writes are committed"""
+    with registry.cursor() as cr:
+        # Concurrent bumps wait for each other instead of failing to serialize
+        cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        for section in sorted(sections):
+            cr.execute("UPDATE %s SET generation = generation + 1 WHERE section = %%s"
+                       % _CACHE_GENERATION_TABLE, [section])
+
+
+def _compute_section_in_worker(registry, uid, su, context, section, date_from, date_to):
+    """Compute one dashboard section on its own read-only cursor"""
+    with registry.cursor() as cr:
+        cr.execute("SET TRANSACTION READ ONLY")
+        env = api.Environment(cr, uid, context, su=su)
+        return env['clinic.kpi']._get_kpi_section(section, date_from, date_to)
 
 
 class ClinicKPI(models.Model):
@@ -12,6 +60,13 @@ class ClinicKPI(models.Model):
     name = fields.Char(string='Dashboard Name', default='Clinic KPI Dashboard', readonly=True)
     date_from = fields.Date(string='From Date', default=lambda self: fields.Date.today().replace(day=1))
     date_to = fields.Date(string='To Date', default=fields.Date.today)
+    comparison_period = fields.Selection([
+        ('previous', 'Previous Period'),
+        ('week', 'Week over Week'),
+        ('month', 'Month over Month'),
+        ('year', 'Year over Year'),
+    ], string='Compare With', default='previous', required=True,
+        help='Period that patient and revenue growth are measured against.')
 
     # Patient Statistics
     total_patients = fields.Integer(string='Total Patients', compute='_compute_patient_kpi')
@@ -58,209 +113,432 @@ class ClinicKPI(models.Model):
     avg_revenue_per_patient = fields.Float(string='Avg Revenue/Patient', compute='_compute_financial_kpi')
     profit_margin = fields.Float(string='Profit Margin (%)', compute='_compute_financial_kpi')
 
+    def init(self):
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS %s (section varchar PRIMARY KEY, generation integer NOT NULL DEFAULT 0)
+        """ % _CACHE_GENERATION_TABLE)
+        self.env.cr.execute("INSERT INTO %s (section) SELECT unnest(%%s::varchar[]) ON CONFLICT DO NOTHING"
+                            % _CACHE_GENERATION_TABLE, [list(KPI_SECTIONS)])
+
     def _compute_patient_kpi(self):
         for record in self:
-            # Total patients registered
-            all_patients = self.env['clinic.patient'].search([('create_date', '<=', record.date_to)])
-            record.total_patients = len(all_patients)
-
-            # New patients in date range
-            new_patients = self.env['clinic.patient'].search([
-                ('create_date', '>=', record.date_from),
-                ('create_date', '<=', record.date_to),
-            ])
-            record.new_patients = len(new_patients)
-
-            # Patient growth calculation
-            previous_total = len(self.env['clinic.patient'].search([
-                ('create_date', '<', record.date_from)
-            ]))
-            if previous_total > 0:
-                record.patient_growth = ((record.total_patients - previous_total) / previous_total) * 100
-            else:
-                record.patient_growth = 100.0 if record.total_patients > 0 else 0.0
+            record.update(self.with_context(kpi_comparison=record.comparison_period)._get_kpi_section(
+                'patient', record.date_from, record.date_to))
 
     def _compute_appointment_kpi(self):
         for record in self:
-            appointments = self.env['clinic.appointment'].search([
-                ('appointment_date', '>=', record.date_from),
-                ('appointment_date', '<=', record.date_to),
-            ])
-            record.total_appointments = len(appointments)
-
-            completed = appointments.filtered(lambda a: a.state == 'done')
-            record.completed_appointments = len(completed)
-
-            cancelled = appointments.filtered(lambda a: a.state == 'cancelled')
-            record.cancelled_appointments = len(cancelled)
-
-            if record.total_appointments > 0:
-                record.appointment_completion_rate = (record.completed_appointments / record.total_appointments) * 100
-            else:
-                record.appointment_completion_rate = 0.0
+            record.update(self.with_context(kpi_comparison=record.comparison_period)._get_kpi_section(
+                'appointment', record.date_from, record.date_to))
 
     def _compute_revenue_kpi(self):
         for record in self:
-            appointments = self.env['clinic.appointment'].search([
-                ('appointment_date', '>=', record.date_from),
-                ('appointment_date', '<=', record.date_to),
-                ('state', '=', 'done'),
-            ])
-
-            record.consultation_revenue = sum(appointments.mapped('total_amount'))
-
-            lab_tests = self.env['clinic.lab.test'].search([
-                ('test_date', '>=', record.date_from),
-                ('test_date', '<=', record.date_to),
-                ('state', '=', 'completed'),
-            ])
-            record.lab_test_revenue = sum(lab_tests.mapped('test_cost'))
-
-            record.total_revenue = record.consultation_revenue + record.lab_test_revenue
-
-            # Revenue growth
-            prev_start = record.date_from - timedelta(days=30)
-            prev_end = record.date_from - timedelta(days=1)
-
-            prev_appointments = self.env['clinic.appointment'].search([
-                ('appointment_date', '>=', prev_start),
-                ('appointment_date', '<=', prev_end),
-                ('state', '=', 'done'),
-            ])
-            prev_revenue = sum(prev_appointments.mapped('total_amount'))
-
-            if prev_revenue > 0:
-                record.revenue_growth = ((record.total_revenue - prev_revenue) / prev_revenue) * 100
-            else:
-                record.revenue_growth = 100.0 if record.total_revenue > 0 else 0.0
+            record.update(self.with_context(kpi_comparison=record.comparison_period)._get_kpi_section(
+                'revenue', record.date_from, record.date_to))
 
     def _compute_doctor_kpi(self):
         for record in self:
-            doctors = self.env['clinic.doctor'].search([('active', '=', True)])
-            record.total_active_doctors = len(doctors)
-
-            appointments = self.env['clinic.appointment'].search([
-                ('appointment_date', '>=', record.date_from),
-                ('appointment_date', '<=', record.date_to),
-            ])
-
-            # Most booked doctor
-            if appointments:
-                doctor_counts = {}
-                for appointment in appointments:
-                    doctor_id = appointment.doctor_id.id
-                    doctor_counts[doctor_id] = doctor_counts.get(doctor_id, 0) + 1
-
-                if doctor_counts:
-                    most_booked_id = max(doctor_counts, key=doctor_counts.get)
-                    record.most_booked_doctor_id = most_booked_id
-                else:
-                    record.most_booked_doctor_id = False
-            else:
-                record.most_booked_doctor_id = False
-
-            # Average consultations per doctor
-            if record.total_active_doctors > 0:
-                record.avg_consultation_per_doctor = len(appointments) / record.total_active_doctors
-            else:
-                record.avg_consultation_per_doctor = 0.0
+            record.update(self.with_context(kpi_comparison=record.comparison_period)._get_kpi_section(
+                'doctor', record.date_from, record.date_to))
 
     def _compute_occupancy_kpi(self):
         for record in self:
-            # Cabin occupancy
-            cabins = self.env['clinic.cabin'].search([('active', '=', True)])
-            if cabins:
-                total_cabin_beds = sum(cabins.mapped('bed_capacity'))
-                occupied_cabin_beds = sum(cabins.mapped('occupied_beds'))
-                if total_cabin_beds > 0:
-                    record.cabin_occupancy_rate = (occupied_cabin_beds / total_cabin_beds) * 100
-                else:
-                    record.cabin_occupancy_rate = 0.0
-            else:
-                record.cabin_occupancy_rate = 0.0
-
-            # Ward occupancy
-            wards = self.env['clinic.ward'].search([('active', '=', True)])
-            if wards:
-                total_ward_beds = sum(wards.mapped('bed_capacity'))
-                occupied_ward_beds = sum(wards.mapped('occupied_beds'))
-                if total_ward_beds > 0:
-                    record.ward_occupancy_rate = (occupied_ward_beds / total_ward_beds) * 100
-                else:
-                    record.ward_occupancy_rate = 0.0
-            else:
-                record.ward_occupancy_rate = 0.0
-
-            # Total admitted patients
-            admitted_patients = self.env['clinic.patient'].search([('is_admitted', '=', True)])
-            record.total_admitted_patients = len(admitted_patients)
+            record.update(self.with_context(kpi_comparison=record.comparison_period)._get_kpi_section(
+                'occupancy', record.date_from, record.date_to))
 
     def _compute_attendance_kpi(self):
         for record in self:
-            employees = self.env['hr.employee'].search([('active', '=', True)])
-            record.total_staff = len(employees)
+            record.update(self.with_context(kpi_comparison=record.comparison_period)._get_kpi_section(
+                'attendance', record.date_from, record.date_to))
 
-            attendances = self.env['clinic.attendance'].search([
-                ('attendance_date', '>=', record.date_from),
-                ('attendance_date', '<=', record.date_to),
-            ])
-
-            if attendances:
-                present_count = len(attendances.filtered(lambda a: a.status in ['present', 'late']))
-                total_expected = len(employees) * ((record.date_to - record.date_from).days + 1)
+    def _compute_lab_kpi(self):
+        for record in self:
+            record.update(self.with_context(kpi_comparison=record.comparison_period)._get_kpi_section(
+                'lab', record.date_from, record.date_to))
 
-                if total_expected > 0:
-                    record.avg_attendance_rate = (present_count / total_expected) * 100
+    def _compute_financial_kpi(self):
+        for record in self:
+            record.update(self.with_context(kpi_comparison=record.comparison_period)._get_kpi_section(
+                'financial', record.date_from, record.date_to))
+
+    @api.model
+    def _get_kpi_section(self, section, date_from, date_to):
+        """Return the field values of a dashboard section, served from the KPI cache when possible"""
+        ttl, max_size = self._get_kpi_cache_config()
+        key = (self.env.cr.dbname, date_from, date_to, self.env.company.id,
+               self.env.context.get('kpi_comparison', 'previous'))
+        generation = self._get_cache_generation(section) if ttl > 0 else None
+        values = kpi_cache.get(key, section, generation) if ttl > 0 else None
+        if values is None:
+            if section == 'financial':
+                values = self._get_financial_kpi(date_from, date_to, {
+                    **self._get_kpi_section('revenue', date_from, date_to),
+                    **self._get_kpi_section('patient', date_from, date_to),
+                })
+            else:
+                values = getattr(self, '_get_%s_kpi' % section)(date_from, date_to)
+            if ttl > 0:
+                kpi_cache.ttl, kpi_cache.max_size = ttl, max_size
+                kpi_cache.set(key, section, values, generation)
+        return dict(values)
+
+    @api.model
+    def _get_cache_generation(self, section):
+        """Generation of a section as seen by this transaction's snapshot, so values
+        read before a write committed are never cached under the generation after it.
+        Financial values also derive from the revenue and patient sections.
+        """
+        sections = ['revenue', 'patient', section] if section == 'financial' else [section]
+        self.env.cr.execute("SELECT section, generation FROM %s WHERE section IN %%s ORDER BY section"
+                            % _CACHE_GENERATION_TABLE, [tuple(sections)])
+        return tuple(self.env.cr.fetchall())
+
+    @api.model
+    def _get_kpi_cache_config(self):
+        params = self.env['ir.config_parameter'].sudo()
+        ttl = int(params.get_param('clinic_management_system.kpi_cache_ttl', 300))
+        max_size = int(params.get_param('clinic_management_system.kpi_cache_size', 128))
+        return ttl, max_size
+
+    @api.model
+    def _invalidate_kpi_cache(self, sections=None):
+        """Drop cached sections now, and in every worker once the transaction commits.
+
+        The cache of this process is cleared at once so the transaction
+        does not read its own stale values; other workers notice the
+        section generations advanced after commit.
+        """
+        kpi_cache.invalidate(self.env.cr.dbname, sections)
+
+        data = self.env.cr.postcommit.data
+        pending = data.get(_CACHE_INVALIDATION_KEY)
+        if pending is None:
+            pending = data[_CACHE_INVALIDATION_KEY] = set()
+            registry = self.pool
+            self.env.cr.postcommit.add(
+                lambda: _bump_cache_generations(registry, data.pop(_CACHE_INVALIDATION_KEY, None) or ()))
+        pending.update(sections or KPI_SECTIONS)
+        self._queue_live_update(sections or KPI_SECTIONS)
+
+    @api.model
+    def _get_live_range(self):
+        """Range shown by live dashboards: the current month to date"""
+        today = fields.Date.context_today(self)
+        return today.replace(day=1), today
+
+    @api.model
+    def _queue_live_update(self, sections):
+        params = self.env['ir.config_parameter'].sudo()
+        if not int(params.get_param('clinic_management_system.kpi_live_updates', 1)):
+            return
+        data = self.env.cr.precommit.data
+        pending = data.get(_LIVE_UPDATE_KEY)
+        if pending is None:
+            pending = data[_LIVE_UPDATE_KEY] = set()
+            self.env.cr.precommit.add(self._push_live_update)
+        pending.update(sections)
+
+    @api.model
+    def _push_live_update(self):
+        """Send the values of the live range to open dashboards over the bus.
+
+        Runs just before commit, once per transaction, and only recomputes
+        the sections the transaction affected. Their full values are sent,
+        once per comparison period in use, as any worker may push next.
+        """
+        sections = self.env.cr.precommit.data.pop(_LIVE_UPDATE_KEY, None)
+        if not sections:
+            return
+        date_from, date_to = self._get_live_range()
+        # Dashboards on an explicit range compare with the previous period
+        comparisons = {'previous'} | {period for period, in self.sudo()._read_group([], ['comparison_period'])}
+        for comparison in sorted(comparisons):
+            kpi = self.with_context(kpi_comparison=comparison)
+            computed = {}
+            for section in KPI_SECTIONS:
+                if section not in sections:
+                    continue
+                if section == 'financial':
+                    computed[section] = kpi._get_financial_kpi(date_from, date_to, {
+                        **(computed.get('revenue') or kpi._get_revenue_kpi(date_from, date_to)),
+                        **(computed.get('patient') or kpi._get_patient_kpi(date_from, date_to)),
+                    })
                 else:
-                    record.avg_attendance_rate = 0.0
+                    computed[section] = getattr(kpi, '_get_%s_kpi' % section)(date_from, date_to)
+
+            values = {}
+            for section_values in computed.values():
+                values.update(section_values)
+            self.env['bus.bus']._sendone(KPI_LIVE_CHANNEL, 'clinic_kpi/update', {
+                'date_from': fields.Date.to_string(date_from),
+                'date_to': fields.Date.to_string(date_to),
+                'comparison': comparison,
+                'values': self._format_dashboard_values(values),
+            })
+        self.env.flush_all()
+
+    @api.model
+    def _get_comparison_range(self, date_from, date_to, period=None):
+        """Return the range a date range is compared with.
+
+        ``previous`` is the period of the same length just before the range;
+        the others shift the range back by a week, a month or a year.
+        """
+        period = period or self.env.context.get('kpi_comparison', 'previous')
+        if period == 'week':
+            shift = relativedelta(weeks=1)
+        elif period == 'month':
+            shift = relativedelta(months=1)
+        elif period == 'year':
+            shift = relativedelta(years=1)
+        else:
+            shift = relativedelta(days=(date_to - date_from).days + 1)
+        return date_from - shift, date_to - shift
+
+    @api.model
+    def _get_growth_rate(self, current, previous):
+        if previous > 0:
+            return ((current - previous) / previous) * 100
+        return 100.0 if current > 0 else 0.0
+
+    @api.model
+    def _get_kpi_growth(self, date_from, date_to):
+        """Week, month and year over year growth of every additive KPI.
+
+        All periods are summed from the daily facts in a single query.
+        """
+        windows = {'current': (date_from, date_to)}
+        for period in ('week', 'month', 'year'):
+            windows[period] = self._get_comparison_range(date_from, date_to, period)
+
+        columns = {column for fact_columns in GROWTH_KPIS.values() for column in fact_columns}
+        totals = self.env['clinic.kpi.daily']._aggregate({
+            f'{column}__{window}': (column, window_from, window_to)
+            for column in columns
+            for window, (window_from, window_to) in windows.items()
+        })
+
+        def kpi_total(kpi, window):
+            return sum(totals[f'{column}__{window}'] for column in GROWTH_KPIS[kpi])
 
-                record.total_overtime_hours = sum(attendances.mapped('overtime_hours'))
-            else:
-                record.avg_attendance_rate = 0.0
-                record.total_overtime_hours = 0.0
+        return {
+            period: {
+                kpi: round(self._get_growth_rate(kpi_total(kpi, 'current'), kpi_total(kpi, period)), 2)
+                for kpi in GROWTH_KPIS
+            }
+            for period in ('week', 'month', 'year')
+        }
+
+    # Each section below runs a single grouped query and returns field values
+
+    @api.model
+    def _get_patient_kpi(self, date_from, date_to):
+        # Growth of the registered patient base since the end of the comparison period
+        dummy, previous_to = self._get_comparison_range(date_from, date_to)
+        totals = self.env['clinic.kpi.daily']._aggregate({
+            'total_patients': ('new_patients', False, date_to),
+            'new_patients': ('new_patients', date_from, date_to),
+            'previous_total': ('new_patients', False, previous_to),
+        })
+        total_patients = int(totals['total_patients'])
 
-    def _compute_lab_kpi(self):
-        for record in self:
-            lab_tests = self.env['clinic.lab.test'].search([
-                ('test_date', '>=', record.date_from),
-                ('test_date', '<=', record.date_to),
-            ])
-            record.total_lab_tests = len(lab_tests)
+        return {
+            'total_patients': total_patients,
+            'new_patients': int(totals['new_patients']),
+            'patient_growth': self._get_growth_rate(total_patients, totals['previous_total']),
+        }
+
+    @api.model
+    def _get_appointment_kpi(self, date_from, date_to):
+        totals = self.env['clinic.kpi.daily']._aggregate({
+            'total': ('appointment_count', date_from, date_to),
+            'done': ('appointment_done', date_from, date_to),
+            'cancelled': ('appointment_cancelled', date_from, date_to),
+        })
+        total = int(totals['total'])
+        completed = int(totals['done'])
+        return {
+            'total_appointments': total,
+            'completed_appointments': completed,
+            'cancelled_appointments': int(totals['cancelled']),
+            'appointment_completion_rate': (completed / total) * 100 if total > 0 else 0.0,
+        }
+
+    @api.model
+    def _get_revenue_kpi(self, date_from, date_to):
+        # Revenue growth compares against the same revenue over the comparison period
+        previous_from, previous_to = self._get_comparison_range(date_from, date_to)
+        totals = self.env['clinic.kpi.daily']._aggregate({
+            'consultation': ('consultation_revenue', date_from, date_to),
+            'lab_test': ('lab_test_revenue', date_from, date_to),
+            'previous_consultation': ('consultation_revenue', previous_from, previous_to),
+            'previous_lab_test': ('lab_test_revenue', previous_from, previous_to),
+        })
+        total_revenue = totals['consultation'] + totals['lab_test']
+        prev_revenue = totals['previous_consultation'] + totals['previous_lab_test']
 
-            completed = lab_tests.filtered(lambda t: t.state == 'completed')
-            record.completed_lab_tests = len(completed)
+        return {
+            'total_revenue': total_revenue,
+            'consultation_revenue': totals['consultation'],
+            'lab_test_revenue': totals['lab_test'],
+            'revenue_growth': self._get_growth_rate(total_revenue, prev_revenue),
+        }
 
-            pending = lab_tests.filtered(lambda t: t.state in ['draft', 'sample_collected', 'in_progress'])
-            record.pending_lab_tests = len(pending)
+    @api.model
+    def _get_doctor_kpi(self, date_from, date_to):
+        active_doctors = self.env['clinic.doctor'].search_count([('active', '=', True)])
 
-            if record.total_lab_tests > 0:
-                record.lab_completion_rate = (record.completed_lab_tests / record.total_lab_tests) * 100
-            else:
-                record.lab_completion_rate = 0.0
+        rows = self.env['clinic.kpi.daily']._aggregate({
+            'appointments': ('appointment_count', date_from, date_to),
+        }, groupby='doctor_id')
+        total_appointments = sum(row['appointments'] for row in rows)
 
-    def _compute_financial_kpi(self):
-        for record in self:
-            payrolls = self.env['clinic.payroll'].search([
-                ('payment_date', '>=', record.date_from),
-                ('payment_date', '<=', record.date_to),
-                ('state', '=', 'paid'),
-            ])
-            record.total_payroll = sum(payrolls.mapped('net_salary'))
-
-            if record.new_patients > 0:
-                record.avg_revenue_per_patient = record.total_revenue / record.new_patients
-            else:
-                record.avg_revenue_per_patient = 0.0
+        # Most booked doctor
+        booked = [row for row in rows if row['doctor_id'] and row['appointments'] > 0]
+        most_booked = max(booked, key=lambda row: row['appointments']) if booked else None
 
-            # Simple profit margin calculation
-            if record.total_revenue > 0:
-                record.profit_margin = ((record.total_revenue - record.total_payroll) / record.total_revenue) * 100
+        return {
+            'most_booked_doctor_id': most_booked['doctor_id'] if most_booked else False,
+            'total_active_doctors': active_doctors,
+            'avg_consultation_per_doctor': total_appointments / active_doctors if active_doctors > 0 else 0.0,
+        }
+
+    @api.model
+    def _get_occupancy_kpi(self, date_from, date_to):
+        # Occupancy is a snapshot: beds of active rooms against the active patients assigned to them
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT
+                (SELECT COALESCE(SUM(bed_capacity), 0) FROM clinic_cabin WHERE active) AS cabin_beds,
+                (SELECT COALESCE(SUM(bed_capacity), 0) FROM clinic_ward WHERE active) AS ward_beds,
+                COUNT(cabin.id) AS cabin_occupied,
+                COUNT(ward.id) AS ward_occupied,
+                COUNT(*) FILTER (WHERE patient.is_admitted) AS admitted
+            FROM clinic_patient patient
+            LEFT JOIN clinic_cabin cabin ON cabin.id = patient.cabin_id AND cabin.active
+            LEFT JOIN clinic_ward ward ON ward.id = patient.ward_id AND ward.active
+            WHERE patient.active
+        """)
+        totals = self.env.cr.dictfetchone()
+        return {
+            'cabin_occupancy_rate': (totals['cabin_occupied'] / totals['cabin_beds']) * 100
+            if totals['cabin_beds'] > 0 else 0.0,
+            'ward_occupancy_rate': (totals['ward_occupied'] / totals['ward_beds']) * 100
+            if totals['ward_beds'] > 0 else 0.0,
+            'total_admitted_patients': totals['admitted'],
+        }
+
+    @api.model
+    def _get_attendance_kpi(self, date_from, date_to):
+        total_staff = self.env['hr.employee'].search_count([('active', '=', True)])
+
+        totals = self.env['clinic.kpi.daily']._aggregate({
+            'count': ('attendance_count', date_from, date_to),
+            'present': ('attendance_present', date_from, date_to),
+            'overtime': ('overtime_hours', date_from, date_to),
+        })
+        if not totals['count']:
+            return {'total_staff': total_staff, 'avg_attendance_rate': 0.0, 'total_overtime_hours': 0.0}
+
+        total_expected = total_staff * ((date_to - date_from).days + 1)
+        return {
+            'total_staff': total_staff,
+            'avg_attendance_rate': (totals['present'] / total_expected) * 100 if total_expected > 0 else 0.0,
+            'total_overtime_hours': totals['overtime'],
+        }
+
+    @api.model
+    def _get_lab_kpi(self, date_from, date_to):
+        totals = self.env['clinic.kpi.daily']._aggregate({
+            'total': ('lab_test_count', date_from, date_to),
+            'completed': ('lab_test_completed', date_from, date_to),
+            'pending': ('lab_test_pending', date_from, date_to),
+        })
+        total = int(totals['total'])
+        completed = int(totals['completed'])
+        return {
+            'total_lab_tests': total,
+            'completed_lab_tests': completed,
+            'pending_lab_tests': int(totals['pending']),
+            'lab_completion_rate': (completed / total) * 100 if total > 0 else 0.0,
+        }
+
+    @api.model
+    def _get_financial_kpi(self, date_from, date_to, values):
+        """``values`` carries the total_revenue and new_patients computed by the other sections"""
+        totals = self.env['clinic.kpi.daily']._aggregate({
+            'payroll': ('payroll_paid', date_from, date_to),
+        })
+        total_payroll = totals['payroll']
+        total_revenue = values['total_revenue']
+
+        # Simple profit margin calculation
+        return {
+            'total_payroll': total_payroll,
+            'avg_revenue_per_patient': total_revenue / values['new_patients'] if values['new_patients'] > 0 else 0.0,
+            'profit_margin': ((total_revenue - total_payroll) / total_revenue) * 100 if total_revenue > 0 else 0.0,
+        }
+
+    @api.model
+    def _get_kpi_sections(self, date_from, date_to):
+        """Return the values of every dashboard section, keyed by section.
+
+        When the kpi_parallel_workers system parameter is set, the sections
+        that do not depend on each other run concurrently, each on a separate
+        read-only cursor, so the slowest section sets the latency. Those
+        cursors only see committed data, so a transaction that changed KPI
+        sources computes its sections itself.
+        """
+        workers = int(self.env['ir.config_parameter'].sudo().get_param(
+            'clinic_management_system.kpi_parallel_workers', 0))
+        if workers <= 1 or self.pool.in_test_mode() or self._has_uncommitted_kpi_changes():
+            return {section: self._get_kpi_section(section, date_from, date_to) for section in KPI_SECTIONS}
+
+        independent = [section for section in KPI_SECTIONS if section != 'financial']
+        with ThreadPoolExecutor(max_workers=min(workers, len(independent))) as executor:
+            futures = {
+                section: executor.submit(
+                    _compute_section_in_worker, self.pool, self.env.uid, self.env.su,
+                    dict(self.env.context), section, date_from, date_to)
+                for section in independent
+            }
+            results = {section: future.result() for section, future in futures.items()}
+
+        results['financial'] = self._get_financial_kpi(date_from, date_to, {
+            **results['revenue'], **results['patient'],
+        })
+        return results
+
+    @api.model
+    def _has_uncommitted_kpi_changes(self):
+        """Whether this transaction changed KPI sources or facts, which other cursors cannot see yet"""
+        return bool(self.env.cr.postcommit.data.get(_CACHE_INVALIDATION_KEY)
+                    or self.env['clinic.kpi.daily']._has_dirty_days())
+
+    @api.model
+    def _get_dashboard_data(self, date_from, date_to):
+        """Compute the dashboard payload for a date range without reading or writing a KPI record"""
+        values = {}
+        for section_values in self._get_kpi_sections(date_from, date_to).values():
+            values.update(section_values)
+        return self._format_dashboard_values(values)
+
+    @api.model
+    def _format_dashboard_values(self, values):
+        data = {}
+        for fname, value in values.items():
+            if fname == 'most_booked_doctor_id':
+                doctor = self.env['clinic.doctor'].browse(value)
+                data['most_booked_doctor'] = doctor.name if doctor else 'N/A'
             else:
-                record.profit_margin = 0.0
+                data[fname] = round(value, 2) if isinstance(value, float) else value
+        return data
 
     def action_refresh_dashboard(self):
         """Refresh all KPI calculations"""
         self.ensure_one()
+        # Warm the section cache, in parallel when enabled, before the computes read it
+        self.with_context(kpi_comparison=self.comparison_period)._get_kpi_sections(
+            self.date_from, self.date_to)
         self._compute_patient_kpi()
         self._compute_appointment_kpi()
         self._compute_revenue_kpi()
@@ -279,4 +557,10 @@ class ClinicKPI(models.Model):
                 'type': 'success',
                 'sticky': False,
             }
-        }
\ No newline at end of file
+        }
+
+    def action_rebuild_facts(self):
+        """Rebuild the daily KPI facts from the source records"""
+        self.env['clinic.kpi.daily']._refresh_days()
+        self._invalidate_kpi_cache()
+        return self.action_refresh_dashboard()
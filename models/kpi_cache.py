@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class KPICache(object):
+    """Process-wide LRU cache of KPI section values.
+
+    Entries are keyed by ``(dbname, date_from, date_to, company_id, comparison)`` and hold
+    one value dict per dashboard section, so a write only drops the sections
+    it affects. Each section is stored with the generation of that section
+    it was computed under; a lookup with another generation misses, which is
+    how writes committed by other worker processes invalidate it. Sections
+    also expire after their TTL.
+    """
+
+    def __init__(self, max_size=128, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, section, generation=None):
+        with self._lock:
+            sections = self._entries.get(key)
+            if not sections or section not in sections:
+                return None
+            expires_at, entry_generation, values = sections[section]
+            if expires_at < time.monotonic() or entry_generation != generation:
+                del sections[section]
+                return None
+            self._entries.move_to_end(key)
+            return values
+
+    def set(self, key, section, values, generation=None):
+        with self._lock:
+            sections = self._entries.setdefault(key, {})
+            sections[section] = (time.monotonic() + self.ttl, generation, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, dbname, sections=None):
+        """Drop the given sections (all of them by default) for every range of a database"""
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] != dbname:
+                    continue
+                if sections is None:
+                    del self._entries[key]
+                    continue
+                entry = self._entries[key]
+                for section in sections:
+                    entry.pop(section, None)
+                if not entry:
+                    del self._entries[key]
+
+
+kpi_cache = KPICache()
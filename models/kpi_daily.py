@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.tools.sql import create_unique_index
+from datetime import timedelta
+
+
+# Additive fact columns, in table order.
+_FACT_COLUMNS = [
+    'appointment_count', 'appointment_draft', 'appointment_confirmed',
+    'appointment_in_progress', 'appointment_done', 'appointment_cancelled',
+    'consultation_revenue',
+    'lab_test_count', 'lab_test_completed', 'lab_test_pending',
+    'lab_test_cancelled', 'lab_test_revenue',
+    'attendance_count', 'attendance_present', 'overtime_hours',
+    'payroll_paid',
+    'new_patients',
+]
+
+# (table, day expression, doctor expression, filter, {fact column: aggregate})
+# Each source feeds its own columns and is refreshed alone when its records change,
+# through an index on its day expression.
+_FACT_SOURCES = [
+    ('clinic_appointment', 'appointment_date', 'doctor_id', None, {
+        'appointment_count': "COUNT(*)",
+        'appointment_draft': "COUNT(*) FILTER (WHERE state = 'draft')",
+        'appointment_confirmed': "COUNT(*) FILTER (WHERE state = 'confirmed')",
+        'appointment_in_progress': "COUNT(*) FILTER (WHERE state = 'in_progress')",
+        'appointment_done': "COUNT(*) FILTER (WHERE state = 'done')",
+        'appointment_cancelled': "COUNT(*) FILTER (WHERE state = 'cancelled')",
+        'consultation_revenue': "COALESCE(SUM(total_amount) FILTER (WHERE state = 'done'), 0)",
+    }),
+    ('clinic_lab_test', 'test_date', 'doctor_id', None, {
+        'lab_test_count': "COUNT(*)",
+        'lab_test_completed': "COUNT(*) FILTER (WHERE state = 'completed')",
+        'lab_test_pending': "COUNT(*) FILTER (WHERE state IN ('draft', 'sample_collected', 'in_progress'))",
+        'lab_test_cancelled': "COUNT(*) FILTER (WHERE state = 'cancelled')",
+        'lab_test_revenue': "COALESCE(SUM(test_cost) FILTER (WHERE state = 'completed'), 0)",
+    }),
+    ('clinic_attendance', 'attendance_date', 'NULL::integer', None, {
+        'attendance_count': "COUNT(*)",
+        'attendance_present': "COUNT(*) FILTER (WHERE status IN ('present', 'late'))",
+        'overtime_hours': "COALESCE(SUM(overtime_hours), 0)",
+    }),
+    ('clinic_payroll', 'payment_date', 'NULL::integer', "state = 'paid'", {
+        'payroll_paid': "COALESCE(SUM(net_salary), 0)",
+    }),
+    ('clinic_patient', 'create_date::date', 'NULL::integer', "active", {
+        'new_patients': "COUNT(*)",
+    }),
+]
+
+_DIRTY_KEY = 'clinic.kpi.daily.dirty'
+
+
+class ClinicKPIDaily(models.Model):
+    _name = 'clinic.kpi.daily'
+    _description = 'Clinic KPI Daily Facts'
+    _rec_name = 'day'
+    _order = 'day desc'
+    _log_access = False
+
+    day = fields.Date(string='Day', required=True, index=True, readonly=True)
+    doctor_id = fields.Many2one('clinic.doctor', string='Doctor', index=True,
+                                readonly=True, ondelete='cascade')
+
+    # Appointments
+    appointment_count = fields.Integer(string='Appointments', readonly=True)
+    appointment_draft = fields.Integer(string='Draft Appointments', readonly=True)
+    appointment_confirmed = fields.Integer(string='Confirmed Appointments', readonly=True)
+    appointment_in_progress = fields.Integer(string='In Progress Appointments', readonly=True)
+    appointment_done = fields.Integer(string='Completed Appointments', readonly=True)
+    appointment_cancelled = fields.Integer(string='Cancelled Appointments', readonly=True)
+    consultation_revenue = fields.Float(string='Consultation Revenue', readonly=True)
+
+    # Lab Tests
+    lab_test_count = fields.Integer(string='Lab Tests', readonly=True)
+    lab_test_completed = fields.Integer(string='Completed Lab Tests', readonly=True)
+    lab_test_pending = fields.Integer(string='Pending Lab Tests', readonly=True)
+    lab_test_cancelled = fields.Integer(string='Cancelled Lab Tests', readonly=True)
+    lab_test_revenue = fields.Float(string='Lab Test Revenue', readonly=True)
+
+    # Attendance
+    attendance_count = fields.Integer(string='Attendances', readonly=True)
+    attendance_present = fields.Integer(string='Present Attendances', readonly=True)
+    overtime_hours = fields.Float(string='Overtime Hours', readonly=True)
+
+    # Payroll
+    payroll_paid = fields.Float(string='Paid Payroll', readonly=True)
+
+    # Patients
+    new_patients = fields.Integer(string='New Patients', readonly=True)
+
+    def init(self):
+        # One row per day and doctor, the clinic-wide facts having no doctor
+        create_unique_index(self.env.cr, 'clinic_kpi_daily_day_doctor_uniq', self._table,
+                            ['day', 'COALESCE(doctor_id, 0)'])
+
+    @api.model
+    def _mark_dirty(self, source, days):
+        """Queue days of a source table whose facts must be rebuilt before the transaction commits"""
+        days = {fields.Date.to_date(day) for day in days if day}
+        if not days:
+            return
+        data = self.env.cr.precommit.data
+        dirty = data.get(_DIRTY_KEY)
+        if dirty is None:
+            dirty = data[_DIRTY_KEY] = {}
+            self.env.cr.precommit.add(self._flush_dirty)
+        dirty.setdefault(source, set()).update(days)
+
+    @api.model
+    def _has_dirty_days(self):
+        return bool(self.env.cr.precommit.data.get(_DIRTY_KEY))
+
+    @api.model
+    def _flush_dirty(self):
+        """Rebuild the facts of the sources and days changed in the current transaction"""
+        dirty = self.env.cr.precommit.data.pop(_DIRTY_KEY, None)
+        for source, days in (dirty or {}).items():
+            self._refresh_days(days, [source])
+
+    @api.model
+    def _refresh_days(self, days=None, sources=None):
+        """Recompute the fact columns fed by the given source tables, or by all of
+        them, for the given days, or for every day when no days are given.
+
+        Only the rows whose values changed are written, so concurrent
+        transactions touching other doctors of the same day do not conflict.
+        """
+        self.env.flush_all()
+        if days is not None:
+            days = sorted(days)
+        restrict_days = days is not None
+        for source in _FACT_SOURCES:
+            if sources is None or source[0] in sources:
+                self.env.cr.execute(self._get_fact_query(source, restrict_days), {'days': days})
+        # Rows left without any source
+        self.env.cr.execute(f"""
+            DELETE FROM clinic_kpi_daily
+            WHERE {"day = ANY(%(days)s) AND " if restrict_days else ""}
+                  ({", ".join(_FACT_COLUMNS)}) = ({", ".join("0" for column in _FACT_COLUMNS)})
+        """, {'days': days})
+        self.invalidate_model()
+
+    @api.model
+    def _get_fact_query(self, source, restrict_days=False):
+        """Upsert the fact columns of one source, leaving the columns of the others alone"""
+        table, day_expr, doctor_expr, condition, aggregates = source
+        conditions = [f"{day_expr} IS NOT NULL"]
+        if condition:
+            conditions.append(condition)
+        if restrict_days:
+            conditions.append(f"{day_expr} = ANY(%(days)s)")
+        source_columns = list(aggregates)
+        src_columns = ", ".join(f"{aggregates[column]} AS {column}" for column in source_columns)
+        fact_values = ", ".join(f"fact.{column}" for column in source_columns)
+        src_values = ", ".join(f"COALESCE(src.{column}, 0)" for column in source_columns)
+        changed_columns = ", ".join(f"COALESCE(src.{column}, 0) AS {column}" for column in source_columns)
+        values = ", ".join(column if column in aggregates else "0" for column in _FACT_COLUMNS)
+        updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in source_columns)
+        return f"""
+            WITH src AS (
+                SELECT {day_expr} AS day, {doctor_expr} AS doctor_id, {src_columns}
+                FROM {table} WHERE {' AND '.join(conditions)} GROUP BY 1, 2
+            ), fact AS (
+                SELECT day, doctor_id, {", ".join(source_columns)} FROM clinic_kpi_daily
+                {"WHERE day = ANY(%(days)s)" if restrict_days else ""}
+            ), changed AS (
+                SELECT COALESCE(src.day, fact.day) AS day,
+                       COALESCE(src.doctor_id, fact.doctor_id) AS doctor_id, {changed_columns}
+                FROM src
+                FULL JOIN fact ON fact.day = src.day AND COALESCE(fact.doctor_id, 0) = COALESCE(src.doctor_id, 0)
+                WHERE ({fact_values}) IS DISTINCT FROM ({src_values})
+            )
+            INSERT INTO clinic_kpi_daily (day, doctor_id, {", ".join(_FACT_COLUMNS)})
+            SELECT day, doctor_id, {values} FROM changed
+            ON CONFLICT (day, COALESCE(doctor_id, 0)) DO UPDATE SET {updates}
+        """
+
+    @api.model
+    def _aggregate(self, measures, groupby=None):
+        """Sum fact columns over several date windows in one grouped query.
+
+        ``measures`` maps a result key to ``(column, date_from, date_to)``,
+        where either bound may be False. Returns a dict of sums, or a list
+        of dicts (one per group, keyed by ``groupby`` too) when grouping.
+        """
+        self._flush_dirty()
+        selects, params = [], []
+        lower_bounds, upper_bounds = set(), set()
+        for key, (column, date_from, date_to) in measures.items():
+            if column not in _FACT_COLUMNS:
+                raise ValueError('Unknown KPI fact column: %s' % column)
+            conditions = []
+            if date_from:
+                conditions.append("day >= %s")
+                params.append(date_from)
+            if date_to:
+                conditions.append("day <= %s")
+                params.append(date_to)
+            window = f" FILTER (WHERE {' AND '.join(conditions)})" if conditions else ""
+            selects.append(f"COALESCE(SUM({column}){window}, 0) AS {key}")
+            lower_bounds.add(date_from)
+            upper_bounds.add(date_to)
+
+        # Scan only the days covered by at least one window
+        conditions = []
+        if all(lower_bounds):
+            conditions.append("day >= %s")
+            params.append(min(lower_bounds))
+        if all(upper_bounds):
+            conditions.append("day <= %s")
+            params.append(max(upper_bounds))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        if groupby:
+            query = (f"SELECT {groupby}, {', '.join(selects)} FROM clinic_kpi_daily"
+                     f"{where} GROUP BY {groupby}")
+        else:
+            query = f"SELECT {', '.join(selects)} FROM clinic_kpi_daily{where}"
+        self.env.cr.execute(query, params)
+        rows = self.env.cr.dictfetchall()
+        return rows if groupby else rows[0]
+
+    @api.model
+    def _get_series_columns(self, granularity='day'):
+        keys = ['day', 'doctor_id', 'doctor'] if granularity == 'doctor' else ['day']
+        return keys + _FACT_COLUMNS
+
+    @api.model
+    def _iter_series(self, date_from, date_to, granularity='day', chunk_size=2000):
+        """Yield lists of per-day (or per-day and per-doctor) fact rows for a date range.
+
+        Rows are read in keyset-paginated chunks so memory stays flat
+        however long the range is.
+        """
+        self._flush_dirty()
+        sums = ", ".join(f"SUM(fact.{column}) AS {column}" for column in _FACT_COLUMNS)
+        if granularity == 'doctor':
+            query = f"""
+                SELECT fact.day, fact.doctor_id, doctor.name AS doctor, {sums}
+                FROM clinic_kpi_daily fact
+                LEFT JOIN clinic_doctor doctor ON doctor.id = fact.doctor_id
+                WHERE fact.day >= %(date_from)s AND fact.day <= %(date_to)s
+                  AND (fact.day, COALESCE(fact.doctor_id, 0)) > (%(last_day)s, %(last_doctor)s)
+                GROUP BY fact.day, fact.doctor_id, doctor.name
+                ORDER BY fact.day, COALESCE(fact.doctor_id, 0)
+                LIMIT %(limit)s
+            """
+        else:
+            query = f"""
+                SELECT fact.day, {sums}
+                FROM clinic_kpi_daily fact
+                WHERE fact.day >= %(date_from)s AND fact.day <= %(date_to)s
+                  AND fact.day > %(last_day)s
+                GROUP BY fact.day
+                ORDER BY fact.day
+                LIMIT %(limit)s
+            """
+        params = {
+            'date_from': date_from,
+            'date_to': date_to,
+            'last_day': date_from - timedelta(days=1),
+            'last_doctor': -1,
+            'limit': chunk_size,
+        }
+        while True:
+            self.env.cr.execute(query, params)
+            rows = self.env.cr.dictfetchall()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            params['last_day'] = rows[-1]['day']
+            params['last_doctor'] = rows[-1].get('doctor_id') or 0
+
+
+class ClinicKPISourceMixin(models.AbstractModel):
+    _name = 'clinic.kpi.source.mixin'
+    _description = 'Clinic KPI Fact Source'
+
+    # Field giving the fact day of a record, the fields whose change alters
+    # what the record contributes to the KPIs, and the dashboard sections
+    # whose cached values it affects.
+    _kpi_date_field = None
+    _kpi_fields = ()
+    _kpi_sections = ()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(ClinicKPISourceMixin, self).create(vals_list)
+        records._kpi_mark_dirty()
+        return records
+
+    def write(self, vals):
+        if not any(fname in vals for fname in self._kpi_fields):
+            return super(ClinicKPISourceMixin, self).write(vals)
+        self._kpi_mark_dirty()
+        res = super(ClinicKPISourceMixin, self).write(vals)
+        self._kpi_mark_dirty()
+        return res
+
+    def unlink(self):
+        self._kpi_mark_dirty()
+        return super(ClinicKPISourceMixin, self).unlink()
+
+    def _kpi_mark_dirty(self):
+        if self._kpi_date_field:
+            self.env['clinic.kpi.daily']._mark_dirty(self._table, self.mapped(self._kpi_date_field))
+        if self._kpi_sections:
+            self.env['clinic.kpi']._invalidate_kpi_cache(self._kpi_sections)
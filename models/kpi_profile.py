@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from odoo import models, fields, api
+
+from .kpi import KPI_SECTIONS
+
+
+class _SectionProfiler(object):
+    """Count wall time, queries, fetched rows and newly cached records while active.
+
+    Queries are the delta of the cursor's ``sql_log_count``; rows are counted
+    by a query hook of the current thread, the hook the Odoo profiler uses,
+    which is removed on exit.
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.wall_time = 0.0
+        self.query_count = 0
+        self.row_count = 0
+        self.prefetch_count = 0
+
+    def _cached_records(self):
+        cache = self.env.cache
+        records = set()
+        for model_name, model_class in self.env.registry.items():
+            if model_class._abstract:
+                continue
+            model = self.env[model_name]
+            for field in model._fields.values():
+                if field.store:
+                    records.update((model_name, record_id)
+                                   for record_id in cache.get_records(model, field)._ids
+                                   if isinstance(record_id, int))
+        return records
+
+    def _count_rows(self, cr, query, params, query_start, query_time):
+        if cr is self.env.cr and cr.description is not None:
+            self.row_count += max(cr.rowcount, 0)
+
+    def __enter__(self):
+        self._cached_before = self._cached_records()
+        self._query_count_before = self.env.cr.sql_log_count
+        thread = threading.current_thread()
+        if not hasattr(thread, 'query_hooks'):
+            thread.query_hooks = []
+        thread.query_hooks.append(self._count_rows)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_time = time.perf_counter() - self._start
+        threading.current_thread().query_hooks.remove(self._count_rows)
+        self.query_count = self.env.cr.sql_log_count - self._query_count_before
+        self.prefetch_count = len(self._cached_records() - self._cached_before)
+        return False
+
+
+class ClinicKPIProfile(models.Model):
+    _name = 'clinic.kpi.profile'
+    _description = 'Clinic KPI Refresh Profile'
+    _rec_name = 'section'
+    _order = 'run_date desc, id'
+
+    run_date = fields.Datetime(string='Run Date', required=True, readonly=True, default=fields.Datetime.now)
+    user_id = fields.Many2one('res.users', string='User', readonly=True, default=lambda self: self.env.user)
+    date_from = fields.Date(string='From Date', readonly=True)
+    date_to = fields.Date(string='To Date', readonly=True)
+    section = fields.Selection([
+        ('patient', 'Patients'),
+        ('appointment', 'Appointments'),
+        ('revenue', 'Revenue'),
+        ('doctor', 'Doctors'),
+        ('occupancy', 'Occupancy'),
+        ('attendance', 'Attendance'),
+        ('lab', 'Lab Tests'),
+        ('financial', 'Financials'),
+    ], string='Section', required=True, readonly=True)
+
+    wall_time = fields.Float(string='Wall Time (ms)', readonly=True, group_operator='avg')
+    query_count = fields.Integer(string='SQL Queries', readonly=True, group_operator='avg')
+    row_count = fields.Integer(string='Rows Fetched', readonly=True, group_operator='avg')
+    prefetch_count = fields.Integer(string='Records Prefetched', readonly=True, group_operator='avg')
+
+    @api.model
+    def _profile_sections(self, date_from, date_to):
+        """Compute every dashboard section uncached and measure each one.
+
+        The runs are stored when the kpi_profile_history system parameter is set.
+        """
+        kpi = self.env['clinic.kpi']
+        self.env['clinic.kpi.daily']._flush_dirty()
+        computed, results = {}, []
+        for section in KPI_SECTIONS:
+            with _SectionProfiler(self.env) as profiler:
+                if section == 'financial':
+                    computed[section] = kpi._get_financial_kpi(date_from, date_to, {
+                        **computed['revenue'], **computed['patient'],
+                    })
+                else:
+                    computed[section] = getattr(kpi, '_get_%s_kpi' % section)(date_from, date_to)
+            results.append({
+                'section': section,
+                'wall_time': round(profiler.wall_time * 1000, 3),
+                'query_count': profiler.query_count,
+                'row_count': profiler.row_count,
+                'prefetch_count': profiler.prefetch_count,
+            })
+
+        params = self.env['ir.config_parameter'].sudo()
+        if int(params.get_param('clinic_management_system.kpi_profile_history', 0)):
+            self.sudo().create([
+                dict(result, date_from=date_from, date_to=date_to) for result in results
+            ])
+        return results
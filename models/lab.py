@@ -1,15 +1,20 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from odoo import models, fields, _
 from odoo.exceptions import ValidationError
 
 
 class ClinicLabTest(models.Model):
     _name = 'clinic.lab.test'
     _description = 'Lab Test'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.kpi.source.mixin', 'clinic.sequence.mixin']
     _rec_name = 'test_number'
     _order = 'test_date desc'
+    _kpi_date_field = 'test_date'
+    _kpi_fields = ('test_date', 'doctor_id', 'state', 'test_cost')
+    _kpi_sections = ('lab', 'revenue', 'financial')
+    _sequence_field = 'test_number'
+    _sequence_code = 'clinic.lab.test'
 
     test_number = fields.Char(string='Test Number', required=True,
                               copy=False, readonly=True, default=lambda self: _('New'))
@@ -35,7 +40,7 @@ class ClinicLabTest(models.Model):
     test_description = fields.Text(string='Description')
 
     # Dates
-    test_date = fields.Date(string='Test Date', default=fields.Date.today, required=True)
+    test_date = fields.Date(string='Test Date', default=fields.Date.today, required=True, index=True)
     result_date = fields.Date(string='Result Date')
 
     # Results
@@ -62,6 +67,7 @@ class ClinicLabTest(models.Model):
 
     # Pricing
     test_cost = fields.Float(string='Test Cost', required=True)
+    invoice_id = fields.Many2one('account.move', string='Invoice', copy=False)
 
     notes = fields.Text(string='Notes')
     priority = fields.Selection([
@@ -70,12 +76,6 @@ class ClinicLabTest(models.Model):
         ('emergency', 'Emergency'),
     ], string='Priority', default='normal', tracking=True)
 
-    @api.model
-    def create(self, vals):
-        if vals.get('test_number', _('New')) == _('New'):
-            vals['test_number'] = self.env['ir.sequence'].next_by_code('clinic.lab.test') or _('New')
-        return super(ClinicLabTest, self).create(vals)
-
     def action_collect_sample(self):
         for record in self:
             record.state = 'sample_collected'
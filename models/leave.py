@@ -8,9 +8,11 @@ from datetime import datetime, timedelta
 class ClinicLeave(models.Model):
     _name = 'clinic.leave'
     _description = 'Leave Management'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.sequence.mixin']
     _rec_name = 'leave_number'
     _order = 'request_date desc'
+    _sequence_field = 'leave_number'
+    _sequence_code = 'clinic.leave'
 
     leave_number = fields.Char(string='Leave Number', required=True,
                                copy=False, readonly=True, default=lambda self: _('New'))
@@ -76,12 +78,6 @@ class ClinicLeave(models.Model):
 
     notes = fields.Text(string='Additional Notes')
 
-    @api.model
-    def create(self, vals):
-        if vals.get('leave_number', _('New')) == _('New'):
-            vals['leave_number'] = self.env['ir.sequence'].next_by_code('clinic.leave') or _('New')
-        return super(ClinicLeave, self).create(vals)
-
     @api.depends('start_date', 'end_date', 'is_half_day')
     def _compute_number_of_days(self):
         for record in self:
@@ -1,19 +1,76 @@
 # -*- coding: utf-8 -*-
 
+import re
+import unicodedata
+
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from odoo.osv import expression
+from odoo.tools import SQL, escape_psql
+from odoo.tools.sql import create_index
+
+
+# Soundex digit of each letter; vowels, h, w and y are not coded
+_SOUNDEX_CODES = {
+    letter: str(digit)
+    for digit, letters in enumerate(['aehiouwy', 'bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r'])
+    for letter in letters
+}
+
+# Fields a merged patient takes from its duplicates when they are empty on it
+_MERGE_FILL_FIELDS = [
+    'email', 'address', 'emergency_contact', 'emergency_phone', 'blood_group', 'allergies',
+    'chronic_diseases', 'current_medications', 'medical_history', 'height', 'weight',
+    'insurance_company', 'insurance_number', 'insurance_expiry', 'partner_id',
+]
+
+
+def normalize_phone(phone):
+    """Keep the digits of a phone number, so every formatting of it compares equal"""
+    return re.sub(r'\D', '', phone or '')
+
+
+def _soundex(word):
+    code, last = word[0].upper(), _SOUNDEX_CODES[word[0]]
+    for letter in word[1:]:
+        digit = _SOUNDEX_CODES[letter]
+        if digit != '0' and digit != last:
+            code += digit
+        # h and w do not separate letters with the same code
+        if letter not in 'hw':
+            last = digit
+    return (code + '000')[:4]
+
+
+def phonetic_key(name):
+    """Sorted Soundex codes of the words of a name, so spelling variants and
+    swapped first and last names share the same key.
+    """
+    ascii_name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode().lower()
+    return ' '.join(sorted({_soundex(word) for word in re.findall(r'[a-z]{2,}', ascii_name)}))
 
 
 class ClinicPatient(models.Model):
     _name = 'clinic.patient'
     _description = 'Patient'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.kpi.source.mixin', 'clinic.sequence.mixin',
+                'clinic.age.mixin']
     _rec_name = 'name'
+    _kpi_date_field = 'create_date'
+    _kpi_fields = ('active', 'cabin_id', 'ward_id', 'is_admitted')
+    _kpi_sections = ('patient', 'occupancy', 'financial')
+    _sequence_field = 'patient_id'
+    _sequence_code = 'clinic.patient'
 
-    name = fields.Char(string='Patient Name', required=True, tracking=True)
-    patient_id = fields.Char(string='Patient ID', required=True, copy=False,
+    name = fields.Char(string='Patient Name', required=True, index='trigram', tracking=True)
+    name_phonetic = fields.Char(string='Phonetic Name', compute='_compute_name_phonetic', store=True,
+                                index=True)
+    patient_id = fields.Char(string='Patient ID', required=True, copy=False, index='trigram',
                              readonly=True, default=lambda self: _('New'))
-    image = fields.Binary(string='Photo')
+    # Photos are stored as attachments; lists and avatars load the thumbnails by URL
+    image = fields.Image(string='Photo', max_width=1920, max_height=1920)
+    image_512 = fields.Image(string='Photo 512', related='image', max_width=512, max_height=512, store=True)
+    image_128 = fields.Image(string='Photo 128', related='image', max_width=128, max_height=128, store=True)
 
     # Personal Information
     gender = fields.Selection([
@@ -22,7 +79,6 @@ class ClinicPatient(models.Model):
         ('other', 'Other')
     ], string='Gender', required=True)
     date_of_birth = fields.Date(string='Date of Birth', required=True)
-    age = fields.Integer(string='Age', compute='_compute_age', store=True)
     blood_group = fields.Selection([
         ('a+', 'A+'), ('a-', 'A-'),
         ('b+', 'B+'), ('b-', 'B-'),
@@ -32,6 +88,8 @@ class ClinicPatient(models.Model):
 
     # Contact Information
     phone = fields.Char(string='Phone', required=True)
+    phone_normalized = fields.Char(string='Normalized Phone', compute='_compute_phone_normalized',
+                                   store=True, index='trigram')
     email = fields.Char(string='Email')
     address = fields.Text(string='Address')
     emergency_contact = fields.Char(string='Emergency Contact')
@@ -55,6 +113,7 @@ class ClinicPatient(models.Model):
     appointment_ids = fields.One2many('clinic.appointment', 'patient_id', string='Appointments')
     prescription_ids = fields.One2many('clinic.prescription', 'patient_id', string='Prescriptions')
     # lab_test_ids = fields.One2many('clinic.lab.test', 'patient_id', string='Lab Tests')
+    partner_id = fields.Many2one('res.partner', string='Invoicing Contact', copy=False)
     cabin_id = fields.Many2one('clinic.cabin', string='Current Cabin')
     ward_id = fields.Many2one('clinic.ward', string='Current Ward')
 
@@ -63,27 +122,65 @@ class ClinicPatient(models.Model):
     is_admitted = fields.Boolean(string='Currently Admitted', default=False)
     admission_date = fields.Date(string='Admission Date')
 
-    # Statistics
-    total_visits = fields.Integer(string='Total Visits', compute='_compute_statistics')
-    last_visit_date = fields.Date(string='Last Visit', compute='_compute_statistics')
-    total_amount_paid = fields.Float(string='Total Amount Paid', compute='_compute_statistics')
+    # Front-desk lookup on name, patient ID and phone
+    patient_lookup = fields.Char(string='Patient Lookup', compute='_compute_patient_lookup',
+                                 search='_search_patient_lookup')
 
-    @api.model
-    def create(self, vals):
-        if vals.get('patient_id', _('New')) == _('New'):
-            vals['patient_id'] = self.env['ir.sequence'].next_by_code('clinic.patient') or _('New')
-        return super(ClinicPatient, self).create(vals)
+    # Statistics, only recomputed for the patients whose appointments changed
+    total_visits = fields.Integer(string='Total Visits', compute='_compute_statistics', store=True)
+    last_visit_date = fields.Date(string='Last Visit', compute='_compute_statistics', store=True)
+    total_amount_paid = fields.Float(string='Total Amount Paid', compute='_compute_statistics', store=True)
+
+    def init(self):
+        # Serves the new patient facts, which group active patients by day of creation
+        create_index(self.env.cr, 'clinic_patient_create_day_idx', self._table,
+                     ['(create_date::date)'], where='active')
 
-    @api.depends('date_of_birth')
-    def _compute_age(self):
+    @api.depends('name')
+    def _compute_name_phonetic(self):
         for record in self:
-            if record.date_of_birth:
-                today = fields.Date.today()
-                record.age = today.year - record.date_of_birth.year - (
-                        (today.month, today.day) < (record.date_of_birth.month, record.date_of_birth.day)
-                )
-            else:
-                record.age = 0
+            record.name_phonetic = phonetic_key(record.name)
+
+    @api.depends('phone')
+    def _compute_phone_normalized(self):
+        for record in self:
+            record.phone_normalized = normalize_phone(record.phone)
+
+    def _compute_patient_lookup(self):
+        for record in self:
+            record.patient_lookup = record.name
+
+    def _search_patient_lookup(self, operator, value):
+        if operator != 'ilike' or not isinstance(value, str):
+            return [('name', operator, value)]
+        return self._get_lookup_domain(value)
+
+    @api.model
+    def _get_lookup_domain(self, term):
+        """Match a term on the name, the patient ID or the digits of the phone, all trigram indexed"""
+        domain = ['|', ('name', 'ilike', term), ('patient_id', 'ilike', term)]
+        digits = normalize_phone(term)
+        if len(digits) >= 3:
+            domain = expression.OR([domain, [('phone_normalized', 'like', digits)]])
+        return domain
+
+    @api.model
+    def _name_search(self, name, domain=None, operator='ilike', limit=None, order=None):
+        # Trigrams need three characters; shorter terms keep the standard search
+        if operator != 'ilike' or len((name or '').strip()) < 3:
+            return super(ClinicPatient, self)._name_search(name, domain, operator, limit, order)
+        name = name.strip()
+        query = self._search(expression.AND([domain or [], self._get_lookup_domain(name)]), limit=limit)
+        # Exact patient IDs and phone numbers first, then names starting with the term
+        table = self._table
+        query.order = SQL(
+            "CASE WHEN %s ILIKE %s OR %s = %s THEN 0 WHEN %s ILIKE %s THEN 1 ELSE 2 END, length(%s), %s",
+            SQL.identifier(table, 'patient_id'), escape_psql(name),
+            SQL.identifier(table, 'phone_normalized'), normalize_phone(name),
+            SQL.identifier(table, 'name'), escape_psql(name) + '%',
+            SQL.identifier(table, 'name'), SQL.identifier(table, 'id'),
+        )
+        return query
 
     @api.depends('height', 'weight')
     def _compute_bmi(self):
@@ -94,12 +191,20 @@ class ClinicPatient(models.Model):
             else:
                 record.bmi = 0.0
 
+    @api.depends('appointment_ids.state', 'appointment_ids.appointment_date', 'appointment_ids.total_amount')
     def _compute_statistics(self):
+        # One aggregate query for the whole batch instead of loading every appointment
+        statistics = {
+            patient.id: (count, last_date, amount)
+            for patient, count, last_date, amount in self.env['clinic.appointment']._read_group(
+                [('patient_id', 'in', self._origin.ids), ('state', '=', 'done')],
+                ['patient_id'], ['__count', 'appointment_date:max', 'total_amount:sum'])
+        }
         for record in self:
-            appointments = record.appointment_ids.filtered(lambda a: a.state == 'done')
-            record.total_visits = len(appointments)
-            record.last_visit_date = max(appointments.mapped('appointment_date')) if appointments else False
-            record.total_amount_paid = sum(appointments.mapped('total_amount'))
+            count, last_date, amount = statistics.get(record._origin.id, (0, False, 0.0))
+            record.total_visits = count
+            record.last_visit_date = last_date
+            record.total_amount_paid = amount
 
     @api.constrains('height', 'weight')
     def _check_measurements(self):
@@ -109,6 +214,92 @@ class ClinicPatient(models.Model):
             if record.weight and record.weight < 0:
                 raise ValidationError(_('Weight cannot be negative.'))
 
+    @api.model
+    def _refresh_ages(self, keys, today):
+        ids = super(ClinicPatient, self)._refresh_ages(keys, today)
+        if ids:
+            # Cascade to the stored related age of the appointments in one statement
+            Appointment = self.env['clinic.appointment']
+            Appointment.flush_model(['patient_id', 'patient_age'])
+            self.env.cr.execute("""
+                UPDATE clinic_appointment appointment SET patient_age = patient.age
+                FROM clinic_patient patient
+                WHERE appointment.patient_id = patient.id AND patient.id IN %s
+                  AND appointment.patient_age IS DISTINCT FROM patient.age
+            """, [tuple(ids)])
+            Appointment.invalidate_model(['patient_age'])
+        return ids
+
+    def _get_invoice_partner(self):
+        """Return the invoicing contacts of the patients, creating the missing ones together"""
+        missing = self.filtered(lambda p: not p.partner_id)
+        if missing:
+            partners = self.env['res.partner'].create([{
+                'name': patient.name,
+                'phone': patient.phone,
+                'email': patient.email,
+            } for patient in missing])
+            for patient, partner in zip(missing, partners):
+                patient.partner_id = partner
+        return self.partner_id
+
+    @api.model
+    def _get_patient_references(self):
+        """Return the ``(model, field)`` of the stored many2one fields pointing to patients"""
+        return [
+            (model_name, field.name)
+            for model_name, model in self.env.registry.items()
+            if model._auto and not model._transient and model_name != 'clinic.patient.duplicate'
+            for field in model._fields.values()
+            if field.type == 'many2one' and field.comodel_name == self._name and field.store
+        ]
+
+    def _merge_patients(self, duplicates):
+        """Merge ``duplicates`` into this patient and archive them.
+
+        Every stored reference to the duplicates is repointed with one write
+        per field, their chatter, followers and activities move over, and
+        empty fields of this patient are completed. A cabin or ward
+        assignment moves over when this patient is not admitted.
+        """
+        self.ensure_one()
+        duplicates -= self
+        if not duplicates:
+            return
+        for model_name, fname in self._get_patient_references():
+            records = self.env[model_name].with_context(active_test=False).search([(fname, 'in', duplicates.ids)])
+            if records:
+                records.write({fname: self.id})
+        # Chatter history, followers and activities belong to the records, not to the user merging
+        chatter_domain = [('model', '=', self._name), ('res_id', 'in', duplicates.ids)]
+        self.env['mail.message'].sudo().search(chatter_domain).write({'res_id': self.id})
+        self.env['mail.activity'].sudo().search([
+            ('res_model', '=', self._name), ('res_id', 'in', duplicates.ids),
+        ]).write({'res_id': self.id})
+        followers = self.env['mail.followers'].sudo().search([
+            ('res_model', '=', self._name), ('res_id', 'in', duplicates.ids),
+        ])
+        self.sudo().message_subscribe(partner_ids=(followers.partner_id - self.message_partner_ids).ids)
+        followers.unlink()
+
+        vals = {}
+        for fname in _MERGE_FILL_FIELDS:
+            source = duplicates.filtered(fname)[:1]
+            if source and not self[fname]:
+                vals[fname] = self._fields[fname].convert_to_write(source[fname], source)
+        admitted = duplicates.filtered('is_admitted')[:1]
+        if admitted and not self.is_admitted:
+            vals.update({
+                'is_admitted': True,
+                'admission_date': admitted.admission_date,
+                'cabin_id': admitted.cabin_id.id,
+                'ward_id': admitted.ward_id.id,
+            })
+        duplicates.write({'active': False, 'is_admitted': False, 'cabin_id': False, 'ward_id': False})
+        if vals:
+            self.write(vals)
+        self.message_post(body=_('Merged duplicate patients: %s') % ', '.join(duplicates.mapped('display_name')))
+
     def action_view_appointments(self):
         self.ensure_one()
         return {
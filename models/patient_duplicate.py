@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+from difflib import SequenceMatcher
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+# Columns of the blocking keys; only patients sharing all columns of a key are compared
+_BLOCKING_KEYS = [
+    ['phone_normalized'],
+    ['date_of_birth', 'name_phonetic'],
+]
+# Larger blocks come from placeholder values, such as a shared reception phone
+_MAX_BLOCK_SIZE = 50
+
+
+class ClinicPatientDuplicate(models.Model):
+    _name = 'clinic.patient.duplicate'
+    _description = 'Possible Duplicate Patients'
+    _rec_name = 'duplicate_id'
+    _order = 'state, score desc, id'
+
+    patient_id = fields.Many2one('clinic.patient', string='Patient', required=True,
+                                 index=True, ondelete='cascade')
+    duplicate_id = fields.Many2one('clinic.patient', string='Possible Duplicate', required=True,
+                                   index=True, ondelete='cascade')
+    score = fields.Integer(string='Score', readonly=True)
+    reasons = fields.Char(string='Matching On', readonly=True)
+    state = fields.Selection([
+        ('new', 'To Review'),
+        ('merged', 'Merged'),
+        ('dismissed', 'Not a Duplicate'),
+    ], string='Status', default='new', required=True)
+
+    _sql_constraints = [
+        ('pair_unique', 'unique(patient_id, duplicate_id)', 'This pair of patients is already recorded.'),
+        ('pair_order', 'CHECK(patient_id < duplicate_id)', 'The older patient of a pair comes first.'),
+    ]
+
+    @api.model
+    def _get_candidate_pairs(self):
+        """Return the ``(id, id)`` pairs of active patients sharing a blocking key.
+
+        Each key groups the patients in one query, so the work grows with the
+        size of the blocks instead of the square of the table.
+        """
+        self.env['clinic.patient'].flush_model(['active'] + [fname for key in _BLOCKING_KEYS for fname in key])
+        pairs = set()
+        for key in _BLOCKING_KEYS:
+            columns = ', '.join(key)
+            self.env.cr.execute("""
+                SELECT array_agg(id ORDER BY id)
+                FROM clinic_patient
+                WHERE active AND %s
+                GROUP BY %s
+                HAVING count(*) BETWEEN 2 AND %%s
+            """ % (' AND '.join("%s IS NOT NULL AND %s::text != ''" % (col, col) for col in key), columns),
+                [_MAX_BLOCK_SIZE])
+            for ids, in self.env.cr.fetchall():
+                pairs.update(itertools.combinations(ids, 2))
+        return pairs
+
+    @api.model
+    def _score_pair(self, patient, other):
+        """Return the 0-100 likelihood that two patients are the same person, and its reasons"""
+        score, reasons = 0, []
+        if patient.phone_normalized and patient.phone_normalized == other.phone_normalized:
+            score += 35
+            reasons.append(_('phone'))
+        if patient.date_of_birth == other.date_of_birth:
+            score += 30
+            reasons.append(_('date of birth'))
+        if patient.name_phonetic and patient.name_phonetic == other.name_phonetic:
+            score += 15
+            reasons.append(_('name sound'))
+        if patient.email and other.email and patient.email.lower() == other.email.lower():
+            score += 10
+            reasons.append(_('email'))
+        score += round(20 * SequenceMatcher(None, patient.name.lower(), other.name.lower()).ratio())
+        if patient.gender != other.gender:
+            score -= 25
+        return max(0, min(score, 100)), reasons
+
+    @api.model
+    def _find_duplicates(self):
+        """Score the candidate pairs not reviewed yet and record the likely duplicates"""
+        params = self.env['ir.config_parameter'].sudo()
+        threshold = int(params.get_param('clinic_management_system.duplicate_threshold', 60))
+        known = {
+            (pair.patient_id.id, pair.duplicate_id.id)
+            for pair in self.search_fetch([], ['patient_id', 'duplicate_id'])
+        }
+        pairs = self._get_candidate_pairs() - known
+        if not pairs:
+            return self.browse()
+
+        patients = self.env['clinic.patient'].browse({patient_id for pair in pairs for patient_id in pair})
+        patients.fetch(['name', 'gender', 'date_of_birth', 'email', 'phone_normalized', 'name_phonetic'])
+        vals_list = []
+        for patient_id, other_id in sorted(pairs):
+            score, reasons = self._score_pair(patients.browse(patient_id), patients.browse(other_id))
+            if score >= threshold:
+                vals_list.append({
+                    'patient_id': patient_id,
+                    'duplicate_id': other_id,
+                    'score': score,
+                    'reasons': ', '.join(reasons),
+                })
+        return self.create(vals_list)
+
+    @api.model
+    def _cron_find_duplicates(self):
+        self._find_duplicates()
+
+    @api.model
+    def action_find_duplicates(self):
+        found = self._find_duplicates()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Duplicate Patients'),
+                'message': _('%s new possible duplicates found.') % len(found),
+                'type': 'success' if found else 'info',
+            },
+        }
+
+    def action_merge(self):
+        """Merge each duplicate into the older patient of its pair"""
+        if any(pair.state != 'new' for pair in self):
+            raise UserError(_('Only pairs still to review can be merged.'))
+        for pair in self:
+            # An earlier pair of the selection may have merged one of these patients already
+            if not (pair.patient_id.active and pair.duplicate_id.active):
+                continue
+            pair.patient_id._merge_patients(pair.duplicate_id)
+            pair.state = 'merged'
+        # Other pairs of the archived patients are found again against the merged patient
+        merged = self.filtered(lambda pair: pair.state == 'merged').duplicate_id
+        self.search([
+            ('state', '=', 'new'),
+            '|', ('patient_id', 'in', merged.ids), ('duplicate_id', 'in', merged.ids),
+        ]).unlink()
+
+    def action_dismiss(self):
+        self.write({'state': 'dismissed'})
@@ -7,9 +7,17 @@ from odoo.exceptions import ValidationError
 class ClinicPayroll(models.Model):
     _name = 'clinic.payroll'
     _description = 'Clinic Payroll'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.kpi.source.mixin', 'clinic.sequence.mixin']
     _rec_name = 'payroll_number'
     _order = 'payment_date desc'
+    _kpi_date_field = 'payment_date'
+    _kpi_fields = ('payment_date', 'state', 'basic_salary', 'house_allowance', 'medical_allowance',
+                   'transport_allowance', 'performance_bonus', 'other_allowances', 'overtime_hours',
+                   'overtime_rate', 'tax_deduction', 'provident_fund', 'insurance', 'loan_deduction',
+                   'advance_deduction', 'other_deductions')
+    _kpi_sections = ('financial',)
+    _sequence_field = 'payroll_number'
+    _sequence_code = 'clinic.payroll'
 
     payroll_number = fields.Char(string='Payroll Number', required=True,
                                  copy=False, readonly=True, default=lambda self: _('New'))
@@ -48,7 +56,7 @@ class ClinicPayroll(models.Model):
 
     payment_year = fields.Integer(string='Payment Year', required=True,
                                   default=lambda self: fields.Date.today().year)
-    payment_date = fields.Date(string='Payment Date', default=fields.Date.today, tracking=True)
+    payment_date = fields.Date(string='Payment Date', default=fields.Date.today, index=True, tracking=True)
 
     # Salary Components
     basic_salary = fields.Float(string='Basic Salary', required=True, tracking=True)
@@ -102,12 +110,6 @@ class ClinicPayroll(models.Model):
 
     notes = fields.Text(string='Notes')
 
-    @api.model
-    def create(self, vals):
-        if vals.get('payroll_number', _('New')) == _('New'):
-            vals['payroll_number'] = self.env['ir.sequence'].next_by_code('clinic.payroll') or _('New')
-        return super(ClinicPayroll, self).create(vals)
-
     @api.depends('basic_salary', 'house_allowance', 'medical_allowance',
                  'transport_allowance', 'performance_bonus', 'other_allowances',
                  'overtime_amount', 'tax_deduction', 'provident_fund',
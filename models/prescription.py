@@ -1,15 +1,17 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from odoo import models, fields, _
 from odoo.exceptions import ValidationError
 
 
 class ClinicPrescription(models.Model):
     _name = 'clinic.prescription'
     _description = 'Prescription'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.sequence.mixin']
     _rec_name = 'prescription_number'
     _order = 'prescription_date desc'
+    _sequence_field = 'prescription_number'
+    _sequence_code = 'clinic.prescription'
 
     prescription_number = fields.Char(string='Prescription Number', required=True,
                                       copy=False, readonly=True, default=lambda self: _('New'))
@@ -55,12 +57,6 @@ class ClinicPrescription(models.Model):
 
     notes = fields.Text(string='Additional Notes')
 
-    @api.model
-    def create(self, vals):
-        if vals.get('prescription_number', _('New')) == _('New'):
-            vals['prescription_number'] = self.env['ir.sequence'].next_by_code('clinic.prescription') or _('New')
-        return super(ClinicPrescription, self).create(vals)
-
     def action_confirm(self):
         for record in self:
             record.state = 'confirmed'
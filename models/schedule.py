@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+from odoo.tools.sql import create_index
+
+WEEKDAYS = [
+    ('0', 'Monday'),
+    ('1', 'Tuesday'),
+    ('2', 'Wednesday'),
+    ('3', 'Thursday'),
+    ('4', 'Friday'),
+    ('5', 'Saturday'),
+    ('6', 'Sunday'),
+]
+
+
+class ClinicScheduleTemplate(models.Model):
+    _name = 'clinic.schedule.template'
+    _description = 'Doctor Schedule Template'
+    _rec_name = 'name'
+
+    name = fields.Char(string='Name', required=True)
+    line_ids = fields.One2many('clinic.schedule.template.line', 'template_id', string='Working Intervals')
+    doctor_ids = fields.One2many('clinic.doctor', 'schedule_template_id', string='Doctors')
+    active = fields.Boolean(string='Active', default=True)
+
+    def write(self, vals):
+        res = super(ClinicScheduleTemplate, self).write(vals)
+        if 'line_ids' in vals or 'active' in vals:
+            self.doctor_ids._mark_availability_dirty()
+        return res
+
+
+class ClinicScheduleTemplateLine(models.Model):
+    _name = 'clinic.schedule.template.line'
+    _description = 'Doctor Schedule Interval'
+    _order = 'weekday, hour_from'
+
+    template_id = fields.Many2one('clinic.schedule.template', string='Template',
+                                  required=True, ondelete='cascade')
+    weekday = fields.Selection(WEEKDAYS, string='Day', required=True, default='0')
+    hour_from = fields.Float(string='From', required=True, default=9.0)
+    hour_to = fields.Float(string='To', required=True, default=17.0)
+
+    @api.constrains('hour_from', 'hour_to')
+    def _check_hours(self):
+        for record in self:
+            if not 0 <= record.hour_from < record.hour_to <= 24:
+                raise ValidationError(_('An interval must end after it starts, within the day.'))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super(ClinicScheduleTemplateLine, self).create(vals_list)
+        lines.template_id.doctor_ids._mark_availability_dirty()
+        return lines
+
+    def write(self, vals):
+        self.template_id.doctor_ids._mark_availability_dirty()
+        res = super(ClinicScheduleTemplateLine, self).write(vals)
+        self.template_id.doctor_ids._mark_availability_dirty()
+        return res
+
+    def unlink(self):
+        self.template_id.doctor_ids._mark_availability_dirty()
+        return super(ClinicScheduleTemplateLine, self).unlink()
+
+
+class ClinicScheduleException(models.Model):
+    _name = 'clinic.schedule.exception'
+    _description = 'Doctor Schedule Exception'
+    _order = 'date_from desc'
+
+    doctor_id = fields.Many2one('clinic.doctor', string='Doctor', required=True,
+                                index=True, ondelete='cascade')
+    date_from = fields.Date(string='From', required=True, default=fields.Date.today)
+    date_to = fields.Date(string='To', required=True, default=fields.Date.today)
+    exception_type = fields.Selection([
+        ('unavailable', 'Unavailable'),
+        ('custom', 'Custom Hours'),
+    ], string='Type', required=True, default='unavailable')
+    hour_from = fields.Float(string='Hours From', default=9.0)
+    hour_to = fields.Float(string='Hours To', default=17.0)
+    reason = fields.Char(string='Reason')
+
+    @api.constrains('date_from', 'date_to', 'exception_type', 'hour_from', 'hour_to')
+    def _check_exception(self):
+        for record in self:
+            if record.date_to < record.date_from:
+                raise ValidationError(_('End date must be after start date.'))
+            if record.exception_type == 'custom' and not 0 <= record.hour_from < record.hour_to <= 24:
+                raise ValidationError(_('Custom hours must end after they start, within the day.'))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        exceptions = super(ClinicScheduleException, self).create(vals_list)
+        exceptions.doctor_id._mark_availability_dirty()
+        return exceptions
+
+    def write(self, vals):
+        self.doctor_id._mark_availability_dirty()
+        res = super(ClinicScheduleException, self).write(vals)
+        self.doctor_id._mark_availability_dirty()
+        return res
+
+    def unlink(self):
+        self.doctor_id._mark_availability_dirty()
+        return super(ClinicScheduleException, self).unlink()
+
+
+class ClinicDoctorAvailability(models.Model):
+    _name = 'clinic.doctor.availability'
+    _description = 'Doctor Availability'
+    _rec_name = 'date'
+    _order = 'date, doctor_id, hour_from'
+    _log_access = False
+
+    doctor_id = fields.Many2one('clinic.doctor', string='Doctor', required=True,
+                                readonly=True, ondelete='cascade')
+    date = fields.Date(string='Date', required=True, readonly=True)
+    hour_from = fields.Float(string='From', readonly=True)
+    hour_to = fields.Float(string='To', readonly=True)
+
+    def init(self):
+        # Every read looks up the intervals of some doctors over a date range
+        create_index(self.env.cr, 'clinic_doctor_availability_doctor_date_idx', self._table,
+                     ['doctor_id', 'date'])
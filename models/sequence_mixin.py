@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api, _
+
+
+class ClinicSequenceMixin(models.AbstractModel):
+    _name = 'clinic.sequence.mixin'
+    _description = 'Clinic Numbered Record'
+
+    # Field holding the record number, and code of the ir.sequence numbering it
+    _sequence_field = None
+    _sequence_code = None
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        placeholder = _('New')
+        pending = [vals for vals in vals_list
+                   if vals.get(self._sequence_field, placeholder) == placeholder]
+        if pending:
+            numbers = self._reserve_sequence_numbers(len(pending))
+            for vals, number in zip(pending, numbers):
+                vals[self._sequence_field] = number or placeholder
+        return super(ClinicSequenceMixin, self).create(vals_list)
+
+    @api.model
+    def _reserve_sequence_numbers(self, count):
+        """Return ``count`` formatted numbers of the model's sequence.
+
+        Standard sequences reserve every number with a single nextval query,
+        no gap sequences lock and advance their row once. Sequences using
+        date ranges fall back to one ``next_by_code`` per number.
+        """
+        company_id = self.env.company.id
+        sequence = self.env['ir.sequence'].sudo().search([
+            ('code', '=', self._sequence_code),
+            ('company_id', 'in', [company_id, False]),
+        ], order='company_id', limit=1)
+        if not sequence:
+            return [False] * count
+        if sequence.use_date_range:
+            return [sequence._next() for dummy in range(count)]
+
+        cr = self.env.cr
+        if sequence.implementation == 'standard':
+            cr.execute("SELECT nextval(%s) FROM generate_series(1, %s)",
+                       ['ir_sequence_%03d' % sequence.id, count])
+            values = sorted(row[0] for row in cr.fetchall())
+        else:
+            cr.execute("SELECT number_next FROM ir_sequence WHERE id = %s FOR UPDATE NOWAIT", [sequence.id])
+            number_next = cr.fetchone()[0]
+            cr.execute("UPDATE ir_sequence SET number_next = number_next + %s WHERE id = %s",
+                       [sequence.number_increment * count, sequence.id])
+            sequence.invalidate_recordset(['number_next'])
+            values = [number_next + sequence.number_increment * i for i in range(count)]
+        return [sequence.get_next_char(value) for value in values]
@@ -0,0 +1,54 @@
+/** @odoo-module **/
+
+import publicWidget from "@web/legacy/js/public/public_widget";
+
+const CURRENCY_FIELDS = [
+    "total_revenue", "consultation_revenue", "lab_test_revenue",
+    "total_payroll", "avg_revenue_per_patient",
+];
+const PERCENT_FIELDS = [
+    "patient_growth", "appointment_completion_rate", "revenue_growth",
+    "cabin_occupancy_rate", "ward_occupancy_rate", "avg_attendance_rate",
+    "lab_completion_rate", "profit_margin",
+];
+
+/**
+ * Applies the KPI values pushed on the clinic_kpi bus channel to an open
+ * dashboard showing the live (month to date) range and comparison period.
+ */
+publicWidget.registry.ClinicKpiLive = publicWidget.Widget.extend({
+    selector: "#clinic_kpi_dashboard",
+
+    init() {
+        this._super(...arguments);
+        this.busService = this.bindService("bus_service");
+    },
+
+    start() {
+        this.busService.addChannel("clinic_kpi");
+        this.busService.subscribe("clinic_kpi/update", (payload) => this._onKpiUpdate(payload));
+        return this._super(...arguments);
+    },
+
+    _onKpiUpdate({ date_from, date_to, comparison, values }) {
+        const { dateFrom, dateTo, comparison: ownComparison } = this.el.dataset;
+        if (date_from !== dateFrom || date_to !== dateTo || comparison !== ownComparison) {
+            return;
+        }
+        for (const [name, value] of Object.entries(values)) {
+            const el = this.el.querySelector(`#${name}`);
+            if (!el) {
+                continue;
+            }
+            if (CURRENCY_FIELDS.includes(name)) {
+                el.textContent = "$" + value;
+            } else if (PERCENT_FIELDS.includes(name)) {
+                el.textContent = value + "%";
+            } else if (name === "total_overtime_hours") {
+                el.textContent = value + " hrs";
+            } else {
+                el.textContent = value;
+            }
+        }
+    },
+});